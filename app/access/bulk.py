@@ -0,0 +1,85 @@
+from sqlalchemy import Boolean, func, literal_column, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.etag import bump_version
+
+# сколько строк уходит в БД одним INSERT ... ON CONFLICT (один round-trip)
+BATCH_SIZE = 1000
+
+_UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+def _created_expr(db: Session, table):
+    """
+    Выражение для RETURNING: строка вставлена, а не обновлена - без отдельного SELECT на пачку.
+    Postgres: xmax = 0 только у версии строки, созданной вставкой.
+    SQLite: писатель один, и после первой записи транзакции чужих вставок до commit не будет;
+    новые rowid больше максимального на этот момент - его читаем один раз на вызов.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return literal_column("xmax = 0", Boolean)
+    max_id = db.execute(select(func.max(table.c.id))).scalar() or 0
+    return table.c.id > max_id
+
+def _upsert_native(
+    db: Session, insert, model, key: tuple[str, ...], rows: list[dict], created,
+) -> dict[tuple, tuple[int, bool]]:
+    # Core-таблица + список параметров: statement компилируется один раз,
+    # а SQLAlchemy (insertmanyvalues) отправляет пачку одним INSERT ... VALUES (...), (...)
+    table = model.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c[k] for k in key],
+        set_={c: stmt.excluded[c] for c in rows[0] if c not in key},
+    ).returning(table.c.id, created, *(table.c[k] for k in key))
+    return {tuple(row[2:]): (row[0], bool(row[1])) for row in db.execute(stmt, rows)}
+
+def _upsert_orm(db: Session, model, key: tuple[str, ...], rows: list[dict]) -> dict[tuple, tuple[int, bool]]:
+    # запасной путь для диалектов без ON CONFLICT: построчно, но в той же транзакции
+    results = {}
+    for row in rows:
+        k = tuple(row[c] for c in key)
+        obj = db.query(model).filter(*(getattr(model, c) == row[c] for c in key)).first()
+        created = obj is None
+        if created:
+            obj = model(**row)
+            db.add(obj)
+        else:
+            for c, v in row.items():
+                setattr(obj, c, v)
+        db.flush()
+        results[k] = (obj.id, created)
+    return results
+
+def bulk_upsert(db: Session, model, key: tuple[str, ...], items: list[dict]) -> list[tuple[int, bool]]:
+    """
+    Вставляет или обновляет items по уникальному ключу key одной транзакцией.
+    Возвращает (id, created) для каждого элемента в исходном порядке.
+    Повторы ключа внутри пачки схлопываются: побеждает последний.
+    """
+    by_key: dict[tuple, dict] = {}
+    for item in items:
+        by_key[tuple(item[k] for k in key)] = item
+    unique = list(by_key.values())
+
+    insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    results: dict[tuple, tuple[int, bool]] = {}
+    try:
+        # версия - первой записью транзакции: на SQLite это и блокировка писателя (см. _created_expr)
+        bump_version(db, model.__tablename__)
+        created = _created_expr(db, model.__table__) if insert is not None else None
+        for i in range(0, len(unique), BATCH_SIZE):
+            chunk = unique[i:i + BATCH_SIZE]
+            if insert is not None:
+                results.update(_upsert_native(db, insert, model, key, chunk, created))
+            else:
+                results.update(_upsert_orm(db, model, key, chunk))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return [results[tuple(item[c] for c in key)] for item in items]
@@ -0,0 +1,106 @@
+"""
+Иерархия ролей: рёбра role_parents + материализованное замыкание role_closure.
+
+Замыкание обновляется инкрементально при добавлении/удалении ребра. Хранится число путей,
+поэтому удаление точное и для DAG (у роли несколько родителей). Проверки прав получают
+все унаследованные роли одним индексным LEFT JOIN - без рекурсивных запросов,
+стоимость не зависит от глубины иерархии.
+
+Функции только меняют сессию (flush); commit, bump версии и invalidate_policy - на вызывающем.
+"""
+from fastapi import HTTPException
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.access.models import Role, RoleClosure, RoleParent, UserRole
+
+# произвольная константа - ключ advisory lock на Postgres (изменения иерархии строго по одному)
+_LOCK_KEY = 0x801E_71EE
+
+def effective_role_id():
+    """Колонка "роль пользователя с учётом наследования" для запросов от UserRole."""
+    return func.coalesce(RoleClosure.ancestor_id, UserRole.role_id)
+
+def user_role_ids(db: Session, user_id: int) -> tuple[int, ...]:
+    rows = (
+        db.query(effective_role_id())
+        .select_from(UserRole)
+        .outerjoin(RoleClosure, RoleClosure.descendant_id == UserRole.role_id)
+        .filter(UserRole.user_id == user_id)
+        .distinct()
+        .all()
+    )
+    return tuple(sorted(r[0] for r in rows))
+
+def _lock(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(func.pg_advisory_xact_lock(_LOCK_KEY).select())
+    # SQLite: писатель и так один
+
+def _ancestors(db: Session, role_id: int) -> dict[int, int]:
+    # у роли без предков строк нет - она предок только сама себе
+    rows = db.query(RoleClosure.ancestor_id, RoleClosure.paths).filter(RoleClosure.descendant_id == role_id).all()
+    return dict(rows) or {role_id: 1}
+
+def _descendants(db: Session, role_id: int) -> dict[int, int]:
+    result = dict(db.query(RoleClosure.descendant_id, RoleClosure.paths).filter(RoleClosure.ancestor_id == role_id).all())
+    result.setdefault(role_id, 1)
+    return result
+
+def _apply(db: Session, parent_id: int, role_id: int, sign: int):
+    """Пути через ребро parent -> role: (предки parent) x (потомки role), с кратностями."""
+    ancestors = _ancestors(db, parent_id)
+    descendants = _descendants(db, role_id)
+    existing = {
+        (row.descendant_id, row.ancestor_id): row
+        for row in db.query(RoleClosure).filter(
+            RoleClosure.descendant_id.in_(descendants), RoleClosure.ancestor_id.in_(ancestors),
+        )
+    }
+    for ancestor_id, up in ancestors.items():
+        for descendant_id, down in descendants.items():
+            delta = sign * up * down
+            row = existing.get((descendant_id, ancestor_id))
+            if row is None:
+                db.add(RoleClosure(descendant_id=descendant_id, ancestor_id=ancestor_id, paths=delta))
+            elif row.paths + delta:
+                row.paths += delta
+            else:
+                db.delete(row)
+
+def add_parent(db: Session, role_id: int, parent_id: int) -> RoleParent:
+    _lock(db)
+    if db.get(Role, role_id) is None or db.get(Role, parent_id) is None:
+        raise HTTPException(404, "Role not found")
+    # цикл: role уже предок parent (или это одна и та же роль)
+    if role_id == parent_id or db.get(RoleClosure, (parent_id, role_id)) is not None:
+        raise HTTPException(400, "Cycle in role hierarchy")
+    if db.query(RoleParent.id).filter(RoleParent.role_id == role_id, RoleParent.parent_id == parent_id).first():
+        raise HTTPException(400, "Role already inherits this parent")
+
+    edge = RoleParent(role_id=role_id, parent_id=parent_id)
+    db.add(edge)
+    # первый предок - у роли появляется строка (r, r)
+    if db.get(RoleClosure, (role_id, role_id)) is None:
+        db.add(RoleClosure(descendant_id=role_id, ancestor_id=role_id, paths=1))
+    _apply(db, parent_id, role_id, +1)
+    db.flush()
+    return edge
+
+def remove_parent(db: Session, edge: RoleParent):
+    _lock(db)
+    _apply(db, edge.parent_id, edge.role_id, -1)
+    db.delete(edge)
+    db.flush()
+    if not db.query(RoleParent.id).filter(RoleParent.role_id == edge.role_id).first():
+        self_row = db.get(RoleClosure, (edge.role_id, edge.role_id))
+        if self_row is not None:
+            db.delete(self_row)
+            db.flush()
+
+def detach_role(db: Session, role_id: int) -> int:
+    """Снять все рёбра роли перед её удалением; возвращает число снятых рёбер."""
+    edges = db.query(RoleParent).filter(or_(RoleParent.role_id == role_id, RoleParent.parent_id == role_id)).all()
+    for edge in edges:
+        remove_parent(db, edge)
+    return len(edges)
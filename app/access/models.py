@@ -1,7 +1,14 @@
-from sqlalchemy import String, Boolean, ForeignKey, Integer, Text, UniqueConstraint
+from functools import lru_cache, reduce
+from operator import add
+
+from sqlalchemy import BigInteger, String, Boolean, ForeignKey, Integer, Text, UniqueConstraint, cast, literal_column
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.core.database import Base
 
+# короткие имена флагов AccessRule (без суффикса _permission); бит i маски прав - PERMISSIONS[i]
+PERMISSIONS = ("read", "read_all", "create", "update", "update_all", "delete", "delete_all")
+
 class Role(Base):
     __tablename__ = "roles"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -22,6 +29,27 @@ class UserRole(Base):
 
     __table_args__ = (UniqueConstraint("user_id", "role_id", name="uq_user_role"),)
 
+class RoleParent(Base):
+    """Ребро иерархии: роль role_id наследует все права роли parent_id."""
+    __tablename__ = "role_parents"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    role_id: Mapped[int] = mapped_column(ForeignKey("roles.id"), index=True)
+    parent_id: Mapped[int] = mapped_column(ForeignKey("roles.id"), index=True)
+
+    __table_args__ = (UniqueConstraint("role_id", "parent_id", name="uq_role_parent"),)
+
+class RoleClosure(Base):
+    """
+    Транзитивное замыкание role_parents (app/access/hierarchy.py): descendant_id наследует ancestor_id.
+    paths - число различных путей; строка исчезает, когда удалён последний путь.
+    У роли с предками есть и строка (r, r); у роли без предков строк нет вовсе -
+    эффективные роли пользователя: COALESCE(ancestor_id, user_roles.role_id) через LEFT JOIN.
+    """
+    __tablename__ = "role_closure"
+    descendant_id: Mapped[int] = mapped_column(ForeignKey("roles.id"), primary_key=True)
+    ancestor_id: Mapped[int] = mapped_column(ForeignKey("roles.id"), primary_key=True, index=True)
+    paths: Mapped[int] = mapped_column(BigInteger, default=1)
+
 class AccessRule(Base):
     __tablename__ = "access_rules"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -40,3 +68,21 @@ class AccessRule(Base):
 
     role = relationship("Role")
     resource = relationship("Resource")
+
+    @hybrid_property
+    def permissions_mask(self) -> int:
+        """Семь флагов одним int; в запросах - то же выражение в SQL."""
+        return sum(1 << i for i, p in enumerate(PERMISSIONS) if getattr(self, f"{p}_permission"))
+
+    @permissions_mask.inplace.expression
+    @classmethod
+    def _permissions_mask_expression(cls):
+        return _mask_expression(cls)
+
+@lru_cache(maxsize=None)
+def _mask_expression(model):
+    # собирается один раз: построение выражения дороже самого запроса на горячем пути
+    return reduce(add, (
+        cast(getattr(model, f"{p}_permission"), Integer) * literal_column(str(1 << i))
+        for i, p in enumerate(PERMISSIONS)
+    ))
@@ -0,0 +1,170 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache, reduce
+from operator import add
+
+from sqlalchemy import Integer, cast, func, literal_column
+from sqlalchemy.orm import Session
+
+from app.access.hierarchy import user_role_ids
+from app.access.models import PERMISSIONS, AccessRule, Resource, Role
+from app.core.config import settings
+from app.core.shared_state import shared_path
+
+# биты маски прав (AccessRule.permissions_mask)
+READ, READ_ALL, CREATE, UPDATE, UPDATE_ALL, DELETE, DELETE_ALL = (1 << i for i in range(len(PERMISSIONS)))
+
+# маска -> frozenset имён прав; таблица на все 128 значений
+_MASK_PERMS = tuple(
+    frozenset(p for i, p in enumerate(PERMISSIONS) if mask >> i & 1) for mask in range(1 << len(PERMISSIONS))
+)
+
+def perms_of(mask: int) -> frozenset[str]:
+    return _MASK_PERMS[mask]
+
+def mask_agg(db: Session):
+    """OR масок по группе строк access_rules: BIT_OR на Postgres, иначе MAX каждого флага, сложенные в маску."""
+    return _mask_agg(db.get_bind().dialect.name)
+
+@lru_cache(maxsize=None)
+def _mask_agg(dialect: str):
+    if dialect == "postgresql":
+        return func.bit_or(AccessRule.permissions_mask)
+    return reduce(add, (
+        func.max(cast(getattr(AccessRule, f"{p}_permission"), Integer)) * literal_column(str(1 << i))
+        for i, p in enumerate(PERMISSIONS)
+    ))
+
+class PolicyMatrix:
+    """
+    Скомпилированная матрица прав: (role_id, resource_code) -> битовая маска разрешений.
+    Неизменяемая; при любом изменении политики строится заново.
+    """
+    def __init__(self, version: int, perms: dict[tuple[int, str], int], admin_role_ids: frozenset[int]):
+        self.version = version
+        self.perms = perms
+        self.admin_role_ids = admin_role_ids
+
+    def effective(self, role_ids: tuple[int, ...], resource_code: str) -> int:
+        perms = self.perms
+        if len(role_ids) == 1:
+            return perms.get((role_ids[0], resource_code), 0)
+        mask = 0
+        for role_id in role_ids:
+            mask |= perms.get((role_id, resource_code), 0)
+        return mask
+
+    def has_admin(self, role_ids: tuple[int, ...]) -> bool:
+        return not self.admin_role_ids.isdisjoint(role_ids)
+
+class PolicyCache:
+    """
+    Кэш политики в памяти процесса:
+      - матрица прав по всем ролям/ресурсам
+      - LRU user_id -> role_ids (вместе с унаследованными по иерархии)
+    Любая запись в roles/resources/access_rules/user_roles обязана вызвать bump():
+    всё, что построено для старой версии, больше не отдаётся.
+    С snapshot (app/access/snapshot.py) версия и матрица общие для всех воркеров.
+    """
+    def __init__(self, max_users: int, snapshot=None):
+        self.max_users = max_users
+        self.snapshot = snapshot
+        self._lock = threading.Lock()
+        self._version = 0
+        self._matrix: PolicyMatrix | None = None
+        self._user_roles: OrderedDict[int, tuple[int, tuple[int, ...]]] = OrderedDict()
+
+    @property
+    def version(self) -> int:
+        if self.snapshot is not None:
+            return self.snapshot.version()
+        return self._version
+
+    def bump(self):
+        if self.snapshot is not None:
+            self.snapshot.bump()
+        with self._lock:
+            self._version += 1
+            self._matrix = None
+            self._user_roles.clear()
+
+    def matrix(self, db: Session) -> PolicyMatrix:
+        version = self.version
+        m = self._matrix
+        if m is not None and m.version == version:
+            return m
+
+        # версию фиксируем до чтения: если во время загрузки случится bump,
+        # результат сразу окажется устаревшим и будет перестроен
+        m = self.snapshot.load(db, version) if self.snapshot is not None else _load_matrix(db, version)
+        with self._lock:
+            if m.version == self.version:
+                self._matrix = m
+        return m
+
+    def role_ids(self, db: Session, user_id: int) -> tuple[int, ...]:
+        version = self.version
+        role_ids = self._cached_role_ids(user_id, version)
+        if role_ids is not None:
+            return role_ids
+
+        role_ids = user_role_ids(db, user_id)
+        with self._lock:
+            if version == self.version:
+                self._user_roles[user_id] = (version, role_ids)
+                self._user_roles.move_to_end(user_id)
+                while len(self._user_roles) > self.max_users:
+                    self._user_roles.popitem(last=False)
+        return role_ids
+
+    def peek(self, user_id: int) -> tuple[tuple[int, ...], PolicyMatrix | None] | None:
+        """
+        Только из кэша, без БД: (role_ids, matrix) либо None, если чего-то не хватает.
+        Нужен async-коду, чтобы на горячем пути не уходить в поток/greenlet.
+        """
+        version = self.version
+        role_ids = self._cached_role_ids(user_id, version)
+        if role_ids is None:
+            return None
+        if not role_ids:
+            return role_ids, None
+        m = self._matrix
+        if m is None or m.version != version:
+            # матрицу уже мог опубликовать другой воркер - это только mmap, без БД
+            if self.snapshot is None:
+                return None
+            m = self.snapshot.mapped(version)
+            if m is None:
+                return None
+            self._matrix = m
+        return role_ids, m
+
+    def _cached_role_ids(self, user_id: int, version: int) -> tuple[int, ...] | None:
+        with self._lock:
+            entry = self._user_roles.get(user_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._user_roles.move_to_end(user_id)
+            return entry[1]
+
+def _load_matrix(db: Session, version: int) -> PolicyMatrix:
+    rows = (
+        db.query(AccessRule.role_id, Resource.code, mask_agg(db))
+        .join(Resource, Resource.id == AccessRule.resource_id)
+        .group_by(AccessRule.role_id, Resource.code)
+        .all()
+    )
+    perms = {(role_id, code): mask for role_id, code, mask in rows if mask}
+
+    admin_role_ids = frozenset(r[0] for r in db.query(Role.id).filter(Role.name == "admin").all())
+    return PolicyMatrix(version, perms, admin_role_ids)
+
+def _shared_snapshot():
+    # по умолчанию включён: без общей версии bump в одном воркере не виден остальным
+    path = shared_path("policy")
+    if path is None:
+        return None
+    from app.access.snapshot import SharedSnapshot
+    return SharedSnapshot(path)
+
+policy_cache = PolicyCache(max_users=settings.policy_user_cache_size, snapshot=_shared_snapshot())
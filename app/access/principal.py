@@ -0,0 +1,97 @@
+from datetime import datetime
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+from fastapi import Request
+from sqlalchemy.orm import Session, contains_eager
+
+from app.accounts.models import User, Session as DbSession
+from app.access.hierarchy import effective_role_id
+from app.access.models import AccessRule, Resource, Role, RoleClosure, UserRole
+from app.access.policy import policy_cache
+
+class Principal(NamedTuple):
+    """
+    Всё, что нужно для авторизации запроса, одним неизменяемым объектом.
+    Права актуальны, пока policy_version совпадает с policy_cache.version.
+    """
+    user_id: int
+    email: str
+    is_active: bool
+    session_id: str
+    expires_at: datetime
+    role_ids: tuple[int, ...]
+    is_admin: bool
+    perms: Mapping[str, int]
+    policy_version: int
+
+    def effective(self, resource_code: str) -> int:
+        return self.perms.get(resource_code, 0)
+
+    def is_fresh(self) -> bool:
+        return self.policy_version == policy_cache.version
+
+def get_principal(request: Request) -> Principal | None:
+    return getattr(request.state, "principal", None)
+
+def load_principal(db: Session, sid: str, uid: int | None = None) -> tuple[User, DbSession, Principal] | None:
+    """
+    Один SQL-запрос: сессия + пользователь + роли + правила по всем ресурсам.
+    Возвращает None, если сессии нет или она невалидна.
+    """
+    return load_principal_checked(db, sid, uid)[0]
+
+def load_principal_checked(
+    db: Session, sid: str, uid: int | None = None
+) -> tuple[tuple[User, DbSession, Principal] | None, str]:
+    """То же, что load_principal, плюс причина: "ok", "session_missing", "session_expired", ..."""
+    # версию фиксируем до чтения: bump во время запроса сделает Principal устаревшим
+    version = policy_cache.version
+
+    q = (
+        db.query(DbSession, User, Role.id, Role.name, Resource.code, AccessRule.permissions_mask)
+        .join(User, User.id == DbSession.user_id)
+        .outerjoin(UserRole, UserRole.user_id == User.id)
+        # роли пользователя вместе с унаследованными - через замыкание, без рекурсии
+        .outerjoin(RoleClosure, RoleClosure.descendant_id == UserRole.role_id)
+        .outerjoin(Role, Role.id == effective_role_id())
+        .outerjoin(AccessRule, AccessRule.role_id == Role.id)
+        .outerjoin(Resource, Resource.id == AccessRule.resource_id)
+        .options(contains_eager(DbSession.user))
+        .filter(DbSession.id == sid)
+    )
+    if uid is not None:
+        q = q.filter(DbSession.user_id == uid)
+    rows = q.all()
+    if not rows:
+        return None, "session_missing"
+
+    sess, user = rows[0][0], rows[0][1]
+    reason = sess.invalid_reason()
+    if reason is not None:
+        return None, reason
+
+    role_ids: set[int] = set()
+    is_admin = False
+    perms: dict[str, int] = {}
+    for _, _, role_id, role_name, code, mask in rows:
+        if role_id is None:
+            continue
+        role_ids.add(role_id)
+        is_admin = is_admin or role_name == "admin"
+        if code is None:
+            continue
+        perms[code] = perms.get(code, 0) | mask
+
+    principal = Principal(
+        user_id=user.id,
+        email=user.email,
+        is_active=user.is_active,
+        session_id=sess.id,
+        expires_at=sess.expires_at,
+        role_ids=tuple(sorted(role_ids)),
+        is_admin=is_admin,
+        perms=MappingProxyType(perms),
+        policy_version=version,
+    )
+    return (user, sess, principal), "ok"
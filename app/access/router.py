@@ -1,133 +1,307 @@
-from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi import APIRouter, Depends, Query, Request, HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
-from app.access.models import Role, Resource, AccessRule
-from app.access.schemas import RoleIn, RoleOut, ResourceIn, ResourceOut, AccessRuleIn, AccessRuleOut
-from app.access.service import require_admin
+from app.core.database import AnySession, get_db, get_read_db, pool_stats, run_db
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, set_cursor
+from app.core.etag import bump_version, get_version, make_etag, matches, not_modified
+from app.core.serialization import FastJSONResponse, rows_response
+from app.core.password_hasher import password_hasher
+from app.accounts.session_cache import session_cache
+from app.core.rate_limit import store as rate_limit_store
+from app.access.models import Role, Resource, AccessRule, RoleParent
+from app.access.schemas import (
+    RoleIn, RoleOut, ResourceIn, ResourceOut, AccessRuleIn, AccessRuleOut, BulkItemOut, RoleParentIn, RoleParentOut,
+)
+from app.access.bulk import bulk_upsert
+from app.access.hierarchy import add_parent, detach_role, remove_parent
+from app.access.principal import get_principal
+from app.access.service import require_admin_async, invalidate_policy
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
+# Роуты асинхронные; сама работа с БД — синхронные функции, которые run_db выполняет
+# в пуле потоков (Session) либо через AsyncSession.run_sync (async-режим).
+
 def require_user_id(request: Request) -> int:
     user = getattr(request.state, "user", None)
     if not user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     return user.id
 
+async def require_admin_user(request: Request, db: AnySession):
+    uid = require_user_id(request)
+    await require_admin_async(db, uid, principal=get_principal(request))
+
+async def _etag(request: Request, db: AnySession, table: str) -> str:
+    # версия таблицы читается до данных: новее данных ETag не бывает
+    return make_etag(table, await run_db(db, get_version, table), request)
+
+def _page(db: Session, model, filters: list, after_id: int | None, limit: int) -> tuple[list, int | None]:
+    return keyset_page(db.query(model).filter(*filters), model, after_id, limit)
+
+# bulk upsert: весь массив - одна транзакция, в БД по одному INSERT ... ON CONFLICT на пачку
+MAX_BULK_ITEMS = 10_000
+
+async def _bulk(db: AnySession, model, key: tuple[str, ...], items: list) -> list[BulkItemOut]:
+    if len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(400, f"Too many items (max {MAX_BULK_ITEMS})")
+    if not items:
+        return []
+    rows = [item.model_dump() for item in items]
+    try:
+        results = await run_db(db, bulk_upsert, model, key, rows)
+    except IntegrityError:
+        raise HTTPException(400, "Constraint violation")
+    invalidate_policy()
+    return [BulkItemOut(index=i, id=obj_id, created=created) for i, (obj_id, created) in enumerate(results)]
+
+def _get_or_404(db: Session, model, obj_id: int):
+    obj = db.query(model).filter(model.id == obj_id).first()
+    if not obj:
+        raise HTTPException(404, "Not found")
+    return obj
+
+def _save(db: Session, obj):
+    db.add(obj)
+    bump_version(db, obj.__tablename__)
+    db.commit(); db.refresh(obj)
+    invalidate_policy()
+    return obj
+
+def _delete(db: Session, model, obj_id: int):
+    obj = _get_or_404(db, model, obj_id)
+    db.delete(obj)
+    bump_version(db, model.__tablename__)
+    db.commit()
+    invalidate_policy()
+
 # ---- Roles ----
 @router.get("/roles", response_model=list[RoleOut])
-def list_roles(request: Request, db: Session = Depends(get_db)):
-    uid = require_user_id(request)
-    require_admin(db, uid)
-    roles = db.query(Role).order_by(Role.id).all()
-    return [RoleOut.model_validate(r, from_attributes=True) for r in roles]
+async def list_roles(
+    request: Request,
+    after_id: int | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    name_prefix: str | None = None,
+    db: AnySession = Depends(get_read_db),
+):
+    await require_admin_user(request, db)
+    etag = await _etag(request, db, "roles")
+    if matches(request, etag):
+        return not_modified(etag)
+    filters = [Role.name.startswith(name_prefix, autoescape=True)] if name_prefix else []
+    roles, next_cursor = await run_db(db, _page, Role, filters, after_id, limit)
+    # уже провалидированные строки из БД: без повторной проверки через response_model
+    response = rows_response(RoleOut, roles, headers={"ETag": etag})
+    set_cursor(response, next_cursor)
+    return response
 
 @router.post("/roles", response_model=RoleOut, status_code=201)
-def create_role(data: RoleIn, request: Request, db: Session = Depends(get_db)):
-    uid = require_user_id(request)
-    require_admin(db, uid)
-    if db.query(Role).filter(Role.name == data.name).first():
-        raise HTTPException(400, "Role already exists")
-    role = Role(name=data.name, description=data.description)
-    db.add(role); db.commit(); db.refresh(role)
+async def create_role(data: RoleIn, request: Request, db: AnySession = Depends(get_db)):
+    await require_admin_user(request, db)
+
+    def _create(db: Session) -> Role:
+        if db.query(Role).filter(Role.name == data.name).first():
+            raise HTTPException(400, "Role already exists")
+        return _save(db, Role(name=data.name, description=data.description))
+
+    role = await run_db(db, _create)
     return RoleOut.model_validate(role, from_attributes=True)
 
+@router.post("/roles/bulk", response_model=list[BulkItemOut])
+async def bulk_upsert_roles(data: list[RoleIn], request: Request, db: AnySession = Depends(get_db)):
+    await require_admin_user(request, db)
+    return await _bulk(db, Role, ("name",), data)
+
 @router.patch("/roles/{role_id}", response_model=RoleOut)
-def update_role(role_id: int, data: RoleIn, request: Request, db: Session = Depends(get_db)):
-    uid = require_user_id(request)
-    require_admin(db, uid)
-    role = db.query(Role).filter(Role.id == role_id).first()
-    if not role:
-        raise HTTPException(404, "Not found")
-    role.name = data.name
-    role.description = data.description
-    db.add(role); db.commit(); db.refresh(role)
+async def update_role(role_id: int, data: RoleIn, request: Request, db: AnySession = Depends(get_db)):
+    await require_admin_user(request, db)
+
+    def _update(db: Session) -> Role:
+        role = _get_or_404(db, Role, role_id)
+        role.name = data.name
+        role.description = data.description
+        return _save(db, role)
+
+    role = await run_db(db, _update)
     return RoleOut.model_validate(role, from_attributes=True)
 
 @router.delete("/roles/{role_id}", status_code=204)
-def delete_role(role_id: int, request: Request, db: Session = Depends(get_db)):
-    uid = require_user_id(request)
-    require_admin(db, uid)
-    role = db.query(Role).filter(Role.id == role_id).first()
-    if not role:
-        raise HTTPException(404, "Not found")
-    db.delete(role); db.commit()
+async def delete_role(role_id: int, request: Request, db: AnySession = Depends(get_db)):
+    await require_admin_user(request, db)
+
+    def _delete_role(db: Session):
+        # рёбра иерархии снимаются с пересчётом замыкания, в той же транзакции
+        if detach_role(db, role_id):
+            bump_version(db, RoleParent.__tablename__)
+        _delete(db, Role, role_id)
+
+    await run_db(db, _delete_role)
+    return None
+
+# ---- Role hierarchy ----
+@router.get("/role-parents", response_model=list[RoleParentOut])
+async def list_role_parents(
+    request: Request,
+    after_id: int | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    role_id: int | None = None,
+    parent_id: int | None = None,
+    db: AnySession = Depends(get_read_db),
+):
+    await require_admin_user(request, db)
+    etag = await _etag(request, db, "role_parents")
+    if matches(request, etag):
+        return not_modified(etag)
+    filters = []
+    if role_id is not None:
+        filters.append(RoleParent.role_id == role_id)
+    if parent_id is not None:
+        filters.append(RoleParent.parent_id == parent_id)
+    edges, next_cursor = await run_db(db, _page, RoleParent, filters, after_id, limit)
+    response = rows_response(RoleParentOut, edges, headers={"ETag": etag})
+    set_cursor(response, next_cursor)
+    return response
+
+@router.post("/role-parents", response_model=RoleParentOut, status_code=201)
+async def create_role_parent(data: RoleParentIn, request: Request, db: AnySession = Depends(get_db)):
+    await require_admin_user(request, db)
+
+    def _create(db: Session) -> RoleParent:
+        return _save(db, add_parent(db, data.role_id, data.parent_id))
+
+    edge = await run_db(db, _create)
+    return RoleParentOut.model_validate(edge, from_attributes=True)
+
+@router.delete("/role-parents/{edge_id}", status_code=204)
+async def delete_role_parent(edge_id: int, request: Request, db: AnySession = Depends(get_db)):
+    await require_admin_user(request, db)
+
+    def _remove(db: Session):
+        remove_parent(db, _get_or_404(db, RoleParent, edge_id))
+        bump_version(db, RoleParent.__tablename__)
+        db.commit()
+        invalidate_policy()
+
+    await run_db(db, _remove)
     return None
 
 # ---- Resources ----
 @router.get("/resources", response_model=list[ResourceOut])
-def list_resources(request: Request, db: Session = Depends(get_db)):
-    uid = require_user_id(request)
-    require_admin(db, uid)
-    items = db.query(Resource).order_by(Resource.id).all()
-    return [ResourceOut.model_validate(r, from_attributes=True) for r in items]
+async def list_resources(
+    request: Request,
+    after_id: int | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    code_prefix: str | None = None,
+    db: AnySession = Depends(get_read_db),
+):
+    await require_admin_user(request, db)
+    etag = await _etag(request, db, "resources")
+    if matches(request, etag):
+        return not_modified(etag)
+    filters = [Resource.code.startswith(code_prefix, autoescape=True)] if code_prefix else []
+    items, next_cursor = await run_db(db, _page, Resource, filters, after_id, limit)
+    response = rows_response(ResourceOut, items, headers={"ETag": etag})
+    set_cursor(response, next_cursor)
+    return response
 
 @router.post("/resources", response_model=ResourceOut, status_code=201)
-def create_resource(data: ResourceIn, request: Request, db: Session = Depends(get_db)):
-    uid = require_user_id(request)
-    require_admin(db, uid)
-    if db.query(Resource).filter(Resource.code == data.code).first():
-        raise HTTPException(400, "Resource already exists")
-    res = Resource(code=data.code, description=data.description)
-    db.add(res); db.commit(); db.refresh(res)
+async def create_resource(data: ResourceIn, request: Request, db: AnySession = Depends(get_db)):
+    await require_admin_user(request, db)
+
+    def _create(db: Session) -> Resource:
+        if db.query(Resource).filter(Resource.code == data.code).first():
+            raise HTTPException(400, "Resource already exists")
+        return _save(db, Resource(code=data.code, description=data.description))
+
+    res = await run_db(db, _create)
     return ResourceOut.model_validate(res, from_attributes=True)
 
+@router.post("/resources/bulk", response_model=list[BulkItemOut])
+async def bulk_upsert_resources(data: list[ResourceIn], request: Request, db: AnySession = Depends(get_db)):
+    await require_admin_user(request, db)
+    return await _bulk(db, Resource, ("code",), data)
+
 @router.patch("/resources/{resource_id}", response_model=ResourceOut)
-def update_resource(resource_id: int, data: ResourceIn, request: Request, db: Session = Depends(get_db)):
-    uid = require_user_id(request)
-    require_admin(db, uid)
-    res = db.query(Resource).filter(Resource.id == resource_id).first()
-    if not res:
-        raise HTTPException(404, "Not found")
-    res.code = data.code
-    res.description = data.description
-    db.add(res); db.commit(); db.refresh(res)
+async def update_resource(resource_id: int, data: ResourceIn, request: Request, db: AnySession = Depends(get_db)):
+    await require_admin_user(request, db)
+
+    def _update(db: Session) -> Resource:
+        res = _get_or_404(db, Resource, resource_id)
+        res.code = data.code
+        res.description = data.description
+        return _save(db, res)
+
+    res = await run_db(db, _update)
     return ResourceOut.model_validate(res, from_attributes=True)
 
 @router.delete("/resources/{resource_id}", status_code=204)
-def delete_resource(resource_id: int, request: Request, db: Session = Depends(get_db)):
-    uid = require_user_id(request)
-    require_admin(db, uid)
-    res = db.query(Resource).filter(Resource.id == resource_id).first()
-    if not res:
-        raise HTTPException(404, "Not found")
-    db.delete(res); db.commit()
+async def delete_resource(resource_id: int, request: Request, db: AnySession = Depends(get_db)):
+    await require_admin_user(request, db)
+    await run_db(db, _delete, Resource, resource_id)
     return None
 
 # ---- Access Rules ----
 @router.get("/access-rules", response_model=list[AccessRuleOut])
-def list_rules(request: Request, db: Session = Depends(get_db)):
-    uid = require_user_id(request)
-    require_admin(db, uid)
-    rules = db.query(AccessRule).order_by(AccessRule.id).all()
-    return [AccessRuleOut.model_validate(r, from_attributes=True) for r in rules]
+async def list_rules(
+    request: Request,
+    after_id: int | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    role_id: int | None = None,
+    resource_id: int | None = None,
+    db: AnySession = Depends(get_read_db),
+):
+    await require_admin_user(request, db)
+    etag = await _etag(request, db, "access_rules")
+    if matches(request, etag):
+        return not_modified(etag)
+    filters = []
+    if role_id is not None:
+        filters.append(AccessRule.role_id == role_id)
+    if resource_id is not None:
+        filters.append(AccessRule.resource_id == resource_id)
+    rules, next_cursor = await run_db(db, _page, AccessRule, filters, after_id, limit)
+    response = rows_response(AccessRuleOut, rules, headers={"ETag": etag})
+    set_cursor(response, next_cursor)
+    return response
 
 @router.post("/access-rules", response_model=AccessRuleOut, status_code=201)
-def create_rule(data: AccessRuleIn, request: Request, db: Session = Depends(get_db)):
-    uid = require_user_id(request)
-    require_admin(db, uid)
-    rule = AccessRule(**data.model_dump())
-    db.add(rule); db.commit(); db.refresh(rule)
+async def create_rule(data: AccessRuleIn, request: Request, db: AnySession = Depends(get_db)):
+    await require_admin_user(request, db)
+    rule = await run_db(db, _save, AccessRule(**data.model_dump()))
     return AccessRuleOut.model_validate(rule, from_attributes=True)
 
+@router.post("/access-rules/bulk", response_model=list[BulkItemOut])
+async def bulk_upsert_rules(data: list[AccessRuleIn], request: Request, db: AnySession = Depends(get_db)):
+    await require_admin_user(request, db)
+    return await _bulk(db, AccessRule, ("role_id", "resource_id"), data)
+
 @router.patch("/access-rules/{rule_id}", response_model=AccessRuleOut)
-def update_rule(rule_id: int, data: AccessRuleIn, request: Request, db: Session = Depends(get_db)):
-    uid = require_user_id(request)
-    require_admin(db, uid)
-    rule = db.query(AccessRule).filter(AccessRule.id == rule_id).first()
-    if not rule:
-        raise HTTPException(404, "Not found")
-    for k, v in data.model_dump().items():
-        setattr(rule, k, v)
-    db.add(rule); db.commit(); db.refresh(rule)
+async def update_rule(rule_id: int, data: AccessRuleIn, request: Request, db: AnySession = Depends(get_db)):
+    await require_admin_user(request, db)
+
+    def _update(db: Session) -> AccessRule:
+        rule = _get_or_404(db, AccessRule, rule_id)
+        for k, v in data.model_dump().items():
+            setattr(rule, k, v)
+        return _save(db, rule)
+
+    rule = await run_db(db, _update)
     return AccessRuleOut.model_validate(rule, from_attributes=True)
 
 @router.delete("/access-rules/{rule_id}", status_code=204)
-def delete_rule(rule_id: int, request: Request, db: Session = Depends(get_db)):
-    uid = require_user_id(request)
-    require_admin(db, uid)
-    rule = db.query(AccessRule).filter(AccessRule.id == rule_id).first()
-    if not rule:
-        raise HTTPException(404, "Not found")
-    db.delete(rule); db.commit()
+async def delete_rule(rule_id: int, request: Request, db: AnySession = Depends(get_db)):
+    await require_admin_user(request, db)
+    await run_db(db, _delete, AccessRule, rule_id)
     return None
+
+# ---- Runtime stats ----
+@router.get("/stats", response_class=FastJSONResponse)
+async def runtime_stats(request: Request, db: AnySession = Depends(get_read_db)):
+    await require_admin_user(request, db)
+    return {
+        "password_hasher": password_hasher.stats(),
+        "session_cache": session_cache.stats(),
+        "db_pool": pool_stats(),
+        "rate_limit": rate_limit_store.stats(),
+    }
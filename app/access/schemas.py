@@ -14,6 +14,14 @@ class ResourceIn(BaseModel):
 class ResourceOut(ResourceIn):
     id: int
 
+class RoleParentIn(BaseModel):
+    # role_id наследует все права parent_id
+    role_id: int
+    parent_id: int
+
+class RoleParentOut(RoleParentIn):
+    id: int
+
 class AccessRuleIn(BaseModel):
     role_id: int
     resource_id: int
@@ -28,3 +36,10 @@ class AccessRuleIn(BaseModel):
 
 class AccessRuleOut(AccessRuleIn):
     id: int
+    # те же флаги одним числом (бит i - PERMISSIONS[i] в app/access/models.py), только для чтения
+    permissions_mask: int = 0
+
+class BulkItemOut(BaseModel):
+    index: int
+    id: int
+    created: bool
@@ -1,17 +1,25 @@
 from sqlalchemy.orm import Session
 from app.accounts.models import User
 from app.access.models import Role, Resource, AccessRule, UserRole
+from app.business.models import Product, Order
+from app.business.mock_data import PRODUCTS, ORDERS
+from app.core.etag import bump_version
 from app.core.security import hash_password
 
 def seed_if_empty(db: Session):
     # если роли уже есть — считаем что сидирование сделано
-    if db.query(Role).first():
-        return
+    if not db.query(Role).first():
+        _seed_access(db)
+    if not db.query(Product).first() and not db.query(Order).first():
+        _seed_business(db)
+
+def _seed_access(db: Session):
 
     admin = Role(name="admin", description="Администратор")
     manager = Role(name="manager", description="Менеджер")
     user = Role(name="user", description="Пользователь")
     db.add_all([admin, manager, user])
+    bump_version(db, Role.__tablename__)
     db.commit()
     db.refresh(admin); db.refresh(manager); db.refresh(user)
 
@@ -19,6 +27,7 @@ def seed_if_empty(db: Session):
     orders = Resource(code="orders", description="Заказы (mock)")
     access_rules = Resource(code="access_rules", description="Правила доступа")
     db.add_all([products, orders, access_rules])
+    bump_version(db, Resource.__tablename__)
     db.commit()
     db.refresh(products); db.refresh(orders); db.refresh(access_rules)
 
@@ -52,6 +61,8 @@ def seed_if_empty(db: Session):
             delete_permission=True, delete_all_permission=False
         ))
 
+    # ETag списков в админке: версия меняется вместе с данными
+    bump_version(db, AccessRule.__tablename__)
     db.commit()
 
     # тестовые пользователи
@@ -72,3 +83,11 @@ def seed_if_empty(db: Session):
         UserRole(user_id=u_user.id, role_id=user.id),
     ])
     db.commit()
+    # invalidate_policy - на вызывающем (app.core.schema), после commit внешней транзакции
+
+def _seed_business(db: Session):
+    # демо-товары и заказы; владельцы - тестовые пользователи выше (id 1..3)
+    # id не передаём: иначе на Postgres не сдвинется sequence
+    db.add_all([Product(name=x["name"], owner_id=x["owner_id"]) for x in PRODUCTS])
+    db.add_all([Order(title=x["title"], owner_id=x["owner_id"]) for x in ORDERS])
+    db.commit()
@@ -0,0 +1,192 @@
+"""
+Синтетический набор данных для нагрузочных замеров.
+
+    python -m app.access.seed_synthetic --users 1000000 --roles 50 --resources 200
+
+Генерирует пользователей, роли, ресурсы, назначения ролей, матрицу правил, сессии
+и (по желанию) товары/заказы. Вставка идёт пачками через executemany по Core-таблицам,
+bcrypt считается один раз: все синтетические пользователи получают один и тот же хэш.
+Запускать поверх базы, которую уже засидировало приложение (seed_if_empty смотрит
+только на наличие ролей). Повторный запуск с тем же --prefix упадёт на уникальных email/name - берите новый префикс.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.core.database import AsyncSessionLocal, Base, SessionLocal, async_engine, engine, is_async, run_db
+from app.core.etag import bump_version
+from app.core.security import hash_password
+from app.accounts.models import User, Session as DbSession
+from app.access.models import Role, Resource, AccessRule, UserRole
+from app.access.service import invalidate_policy
+from app.business.models import Product, Order
+import app.models  # noqa: F401 - create_all по полному набору таблиц
+
+class Spec:
+    def __init__(self, args: argparse.Namespace):
+        self.prefix = args.prefix
+        self.users = args.users
+        self.roles = args.roles
+        self.resources = args.resources
+        self.roles_per_user = args.roles_per_user
+        self.rule_density = args.rule_density
+        self.all_ratio = args.all_ratio
+        self.sessions_per_user = args.sessions_per_user
+        self.dead_session_ratio = args.dead_session_ratio
+        self.products_per_user = args.products_per_user
+        self.orders_per_user = args.orders_per_user
+        self.password = args.password
+        self.batch_size = args.batch_size
+        self.rng = random.Random(args.seed)
+
+def _insert_batched(db: Session, model, rows, batch_size: int) -> int:
+    # rows - генератор: миллион словарей целиком в памяти не держим
+    stmt = insert(model.__table__)
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.execute(stmt, batch)
+            db.commit()
+            total += len(batch)
+            batch = []
+    if batch:
+        db.execute(stmt, batch)
+        total += len(batch)
+    if total:
+        # иначе клиенты со старым ETag списка получали бы 304
+        bump_version(db, model.__tablename__)
+    db.commit()
+    return total
+
+def _ids(db: Session, column, values: list[str], batch_size: int) -> list[int]:
+    # ровно вставленные значения, а не LIKE по префиксу: префикс syn совпал бы и с syn-big
+    model = column.class_
+    ids = []
+    for i in range(0, len(values), batch_size):
+        ids += db.execute(select(model.id).where(column.in_(values[i:i + batch_size]))).scalars()
+    return sorted(ids)
+
+def _rule(spec: Spec, role_id: int, resource_id: int) -> dict:
+    rng = spec.rng
+    wide = rng.random() < spec.all_ratio
+    return {
+        "role_id": role_id, "resource_id": resource_id,
+        "read_permission": True, "read_all_permission": wide,
+        "create_permission": rng.random() < 0.5,
+        "update_permission": rng.random() < 0.5, "update_all_permission": wide and rng.random() < 0.5,
+        "delete_permission": rng.random() < 0.3, "delete_all_permission": wide and rng.random() < 0.3,
+    }
+
+def seed_synthetic(db: Session, spec: Spec) -> dict[str, int]:
+    rng = spec.rng
+    now = datetime.now(timezone.utc)
+    p = spec.prefix
+    counts = {}
+
+    role_names = [f"{p}-role-{i}" for i in range(spec.roles)]
+    counts["roles"] = _insert_batched(db, Role, (
+        {"name": name, "description": ""} for name in role_names
+    ), spec.batch_size)
+    role_ids = _ids(db, Role.name, role_names, spec.batch_size)
+
+    # реальные коды ресурсов тоже попадают в матрицу, чтобы бизнес-роуты видели правила
+    resource_codes = [f"{p}-res-{i}" for i in range(spec.resources)]
+    counts["resources"] = _insert_batched(db, Resource, (
+        {"code": code, "description": ""} for code in resource_codes
+    ), spec.batch_size)
+    resource_ids = _ids(db, Resource.code, resource_codes, spec.batch_size)
+    resource_ids += list(db.execute(select(Resource.id).where(Resource.code.in_(["products", "orders"]))).scalars())
+
+    counts["access_rules"] = _insert_batched(db, AccessRule, (
+        _rule(spec, role_id, resource_id)
+        for role_id in role_ids for resource_id in resource_ids
+        if rng.random() < spec.rule_density
+    ), spec.batch_size)
+
+    password_hash = hash_password(spec.password)
+    emails = [f"{p}-{i}@synthetic.test" for i in range(spec.users)]
+    counts["users"] = _insert_batched(db, User, (
+        {"full_name": f"User {i}", "email": email, "password_hash": password_hash,
+         "is_active": True, "created_at": now, "updated_at": now}
+        for i, email in enumerate(emails)
+    ), spec.batch_size)
+    user_ids = _ids(db, User.email, emails, spec.batch_size)
+
+    per_user = min(spec.roles_per_user, len(role_ids))
+    counts["user_roles"] = _insert_batched(db, UserRole, (
+        {"user_id": user_id, "role_id": role_id}
+        for user_id in user_ids for role_id in rng.sample(role_ids, per_user)
+    ), spec.batch_size)
+
+    def sessions():
+        alive_until = now + timedelta(days=7)
+        for user_id in user_ids:
+            n = int(spec.sessions_per_user) + (rng.random() < spec.sessions_per_user % 1)
+            for _ in range(n):
+                dead = rng.random() < spec.dead_session_ratio
+                yield {
+                    "id": str(uuid.uuid4()), "user_id": user_id, "created_at": now,
+                    "expires_at": now - timedelta(days=1) if dead else alive_until,
+                    "revoked_at": None, "ip": None, "user_agent": "synthetic",
+                }
+    counts["sessions"] = _insert_batched(db, DbSession, sessions(), spec.batch_size)
+
+    counts["products"] = _insert_batched(db, Product, (
+        {"name": f"Product {user_id}-{i}", "owner_id": user_id}
+        for user_id in user_ids for i in range(spec.products_per_user)
+    ), spec.batch_size)
+    counts["orders"] = _insert_batched(db, Order, (
+        {"title": f"Order {user_id}-{i}", "owner_id": user_id}
+        for user_id in user_ids for i in range(spec.orders_per_user)
+    ), spec.batch_size)
+
+    invalidate_policy()
+    return counts
+
+async def run(spec: Spec) -> dict[str, int]:
+    if is_async:
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncSessionLocal() as db:
+            return await run_db(db, seed_synthetic, spec)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        return await run_db(db, seed_synthetic, spec)
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Сгенерировать синтетический набор данных для замеров")
+    parser.add_argument("--prefix", default="syn", help="префикс имён/email, уникальный на запуск")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--roles", type=int, default=20)
+    parser.add_argument("--resources", type=int, default=50)
+    parser.add_argument("--roles-per-user", type=int, default=2)
+    parser.add_argument("--rule-density", type=float, default=0.3, help="доля пар (роль, ресурс) с правилом")
+    parser.add_argument("--all-ratio", type=float, default=0.2, help="доля правил с *_all правами")
+    parser.add_argument("--sessions-per-user", type=float, default=1.0)
+    parser.add_argument("--dead-session-ratio", type=float, default=0.3, help="доля истёкших сессий")
+    parser.add_argument("--products-per-user", type=int, default=0)
+    parser.add_argument("--orders-per-user", type=int, default=0)
+    parser.add_argument("--password", default="synthetic123", help="общий пароль синтетических пользователей")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0, help="seed генератора случайных чисел")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = asyncio.run(run(Spec(args)))
+    for table, n in counts.items():
+        print(f"{table:>13}  {n}")
+    print(f"\nduration={time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
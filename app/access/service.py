@@ -1,62 +1,216 @@
 from fastapi import HTTPException
+from sqlalchemy import ColumnElement, false, true
 from sqlalchemy.orm import Session
-from app.access.models import UserRole, AccessRule, Resource, Role
+from app.access.policy import (
+    CREATE, DELETE, DELETE_ALL, READ, READ_ALL, UPDATE, UPDATE_ALL, PolicyMatrix, perms_of, policy_cache,
+)
+from app.access.principal import Principal
+from app.core.database import AnySession, run_db
+from app.core.instrumentation import phase
+from app.core.metrics import authz_denials
 
 ACTIONS = {"read", "create", "update", "delete"}
 
-def is_admin(db: Session, user_id: int) -> bool:
-    return (
-        db.query(UserRole)
-        .join(Role, Role.id == UserRole.role_id)
-        .filter(UserRole.user_id == user_id, Role.name == "admin")
-        .first()
-        is not None
-    )
+# действие -> (бит "свои", бит "все"); у create одно право, оно же "все"
+_ACTION_BITS = {
+    "read": (READ, READ_ALL),
+    "create": (CREATE, CREATE),
+    "update": (UPDATE, UPDATE_ALL),
+    "delete": (DELETE, DELETE_ALL),
+}
 
-def can(db: Session, user_id: int, resource_code: str, action: str, owner_id: int | None) -> bool:
+def invalidate_policy():
+    """Вызывать после любого commit в roles/resources/access_rules/user_roles."""
+    policy_cache.bump()
+
+class _Grants:
+    """Роли пользователя + матрица политики; тот же интерфейс, что и у Principal."""
+    __slots__ = ("role_ids", "matrix")
+
+    def __init__(self, role_ids: tuple[int, ...], matrix: PolicyMatrix | None):
+        self.role_ids = role_ids
+        self.matrix = matrix
+
+    @property
+    def is_admin(self) -> bool:
+        return self.matrix is not None and self.matrix.has_admin(self.role_ids)
+
+    def effective(self, resource_code: str) -> int:
+        if self.matrix is None:
+            return 0
+        return self.matrix.effective(self.role_ids, resource_code)
+
+Resolved = _Grants | Principal
+
+def _from_principal(principal: Principal | None, user_id: int) -> Principal | None:
+    # Principal из AuthMiddleware годится, пока с момента его загрузки политика не менялась
+    if principal is not None and principal.user_id == user_id and principal.is_fresh():
+        return principal
+    return None
+
+def _resolve(db: Session, user_id: int, principal: Principal | None = None) -> Resolved:
+    fresh = _from_principal(principal, user_id)
+    if fresh is not None:
+        return fresh
+    with phase("authz"):
+        role_ids = policy_cache.role_ids(db, user_id)
+        return _Grants(role_ids, policy_cache.matrix(db) if role_ids else None)
+
+async def _resolve_async(db: AnySession, user_id: int, principal: Principal | None = None) -> Resolved:
+    fresh = _from_principal(principal, user_id)
+    if fresh is not None:
+        return fresh
+    # горячий путь: всё есть в кэше -> ни потока, ни запроса к БД
+    cached = policy_cache.peek(user_id)
+    if cached is not None:
+        return _Grants(*cached)
+    with phase("authz"):
+        return await run_db(db, _resolve, user_id)
+
+def is_admin(db: Session, user_id: int, principal: Principal | None = None) -> bool:
+    return _resolve(db, user_id, principal).is_admin
+
+async def is_admin_async(db: AnySession, user_id: int, principal: Principal | None = None) -> bool:
+    return (await _resolve_async(db, user_id, principal)).is_admin
+
+class EffectivePermissions:
     """
-    owner_id:
-      - None для list/create (где нет конкретного объекта)
-      - конкретный owner_id для retrieve/update/delete
+    Итоговые права пользователя на один ресурс (OR масок по всем его ролям).
+    Считается один раз и дальше отвечает на любое число проверок битовыми тестами, без БД.
     """
-    if action not in ACTIONS:
-        return False
+    __slots__ = ("user_id", "resource_code", "mask")
 
-    resource = db.query(Resource).filter(Resource.code == resource_code).first()
-    if not resource:
-        return False
+    def __init__(self, user_id: int, resource_code: str, mask: int):
+        self.user_id = user_id
+        self.resource_code = resource_code
+        self.mask = mask
 
-    role_ids = [r[0] for r in db.query(UserRole.role_id).filter(UserRole.user_id == user_id).all()]
-    if not role_ids:
-        return False
+    @property
+    def perms(self) -> frozenset[str]:
+        return perms_of(self.mask)
 
-    rules = db.query(AccessRule).filter(AccessRule.role_id.in_(role_ids), AccessRule.resource_id == resource.id).all()
-    if not rules:
-        return False
+    @property
+    def read_all(self) -> bool:
+        return bool(self.mask & READ_ALL)
+
+    @property
+    def update_all(self) -> bool:
+        return bool(self.mask & UPDATE_ALL)
+
+    @property
+    def delete_all(self) -> bool:
+        return bool(self.mask & DELETE_ALL)
 
-    if action == "create":
-        return any(r.create_permission for r in rules)
+    def allows(self, action: str, owner_id: int | None) -> bool:
+        """
+        owner_id:
+          - None для list/create (где нет конкретного объекта)
+          - конкретный owner_id для retrieve/update/delete
+        """
+        allowed = self._decide(action, owner_id)
+        if not allowed:
+            authz_denials.inc(self.resource_code, action)
+        return allowed
 
-    if action == "read":
-        if any(r.read_all_permission for r in rules):
+    def _decide(self, action: str, owner_id: int | None) -> bool:
+        bits = _ACTION_BITS.get(action)
+        if bits is None:
+            return False
+        own, any_owner = bits
+        mask = self.mask
+        if mask & any_owner:
             return True
-        # list: owner_id None -> можно, если есть read_permission (но отдавать будем только свои)
+        if not mask & own:
+            return False
+        # list: owner_id None -> можно (но отдавать будем только свои)
         if owner_id is None:
-            return any(r.read_permission for r in rules)
-        return owner_id == user_id and any(r.read_permission for r in rules)
+            return action == "read"
+        return owner_id == self.user_id
 
-    if action == "update":
-        if any(r.update_all_permission for r in rules):
-            return True
-        return owner_id == user_id and any(r.update_permission for r in rules)
+    def where(self, action: str, owner_col) -> ColumnElement[bool]:
+        """
+        То же решение, что allows(), но в виде условия WHERE для выборки строк:
+          - *_all -> true() (без ограничений)
+          - только свои -> owner_col == user_id
+          - нет права -> false() (БД вернёт пустой результат, строки в Python не едут)
+        """
+        bits = _ACTION_BITS.get(action)
+        if bits is None or not self.mask & (bits[0] | bits[1]):
+            return false()
+        if self.mask & bits[1]:
+            return true()
+        return owner_col == self.user_id
 
-    if action == "delete":
-        if any(r.delete_all_permission for r in rules):
-            return True
-        return owner_id == user_id and any(r.delete_permission for r in rules)
+def _effective(resolved: Resolved, user_id: int, resource_code: str) -> EffectivePermissions:
+    return EffectivePermissions(user_id, resource_code, resolved.effective(resource_code))
+
+def effective_permissions(
+    db: Session, user_id: int, resource_code: str, principal: Principal | None = None
+) -> EffectivePermissions:
+    return _effective(_resolve(db, user_id, principal), user_id, resource_code)
+
+async def effective_permissions_async(
+    db: AnySession, user_id: int, resource_code: str, principal: Principal | None = None
+) -> EffectivePermissions:
+    return _effective(await _resolve_async(db, user_id, principal), user_id, resource_code)
+
+def can(
+    db: Session, user_id: int, resource_code: str, action: str, owner_id: int | None,
+    principal: Principal | None = None,
+) -> bool:
+    if action not in ACTIONS:
+        return False
+    return effective_permissions(db, user_id, resource_code, principal).allows(action, owner_id)
+
+async def can_async(
+    db: AnySession, user_id: int, resource_code: str, action: str, owner_id: int | None,
+    principal: Principal | None = None,
+) -> bool:
+    if action not in ACTIONS:
+        return False
+    return (await effective_permissions_async(db, user_id, resource_code, principal)).allows(action, owner_id)
+
+def authz_filter(
+    db: Session, user_id: int, resource_code: str, action: str, owner_col,
+    principal: Principal | None = None,
+) -> ColumnElement[bool]:
+    """Условие для list/bulk update/bulk delete: авторизация выполняется в самом запросе."""
+    return effective_permissions(db, user_id, resource_code, principal).where(action, owner_col)
+
+async def authz_filter_async(
+    db: AnySession, user_id: int, resource_code: str, action: str, owner_col,
+    principal: Principal | None = None,
+) -> ColumnElement[bool]:
+    return (await effective_permissions_async(db, user_id, resource_code, principal)).where(action, owner_col)
 
-    return False
+def _decide_many(resolved: Resolved, user_id: int, checks: list[tuple[str, str, int | None]]) -> list[bool]:
+    by_resource: dict[str, EffectivePermissions] = {}
+    result = []
+    for resource_code, action, owner_id in checks:
+        perms = by_resource.get(resource_code)
+        if perms is None:
+            perms = by_resource[resource_code] = _effective(resolved, user_id, resource_code)
+        result.append(perms.allows(action, owner_id))
+    return result
+
+def can_many(
+    db: Session, user_id: int, checks: list[tuple[str, str, int | None]], principal: Principal | None = None
+) -> list[bool]:
+    """
+    Пакетная проверка: checks = [(resource_code, action, owner_id), ...].
+    Роли и правила разрешаются один раз, решение возвращается для каждой проверки по порядку.
+    """
+    return _decide_many(_resolve(db, user_id, principal), user_id, checks)
+
+async def can_many_async(
+    db: AnySession, user_id: int, checks: list[tuple[str, str, int | None]], principal: Principal | None = None
+) -> list[bool]:
+    return _decide_many(await _resolve_async(db, user_id, principal), user_id, checks)
+
+def require_admin(db: Session, user_id: int, principal: Principal | None = None):
+    if not is_admin(db, user_id, principal):
+        raise HTTPException(status_code=403, detail="Forbidden")
 
-def require_admin(db: Session, user_id: int):
-    if not is_admin(db, user_id):
+async def require_admin_async(db: AnySession, user_id: int, principal: Principal | None = None):
+    if not await is_admin_async(db, user_id, principal):
         raise HTTPException(status_code=403, detail="Forbidden")
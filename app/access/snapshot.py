@@ -0,0 +1,177 @@
+"""
+Общий для всех воркеров снимок политики в memory-mapped файлах (SHARED_STATE_DIR).
+
+  policy.version - SharedCounter, версия политики. Каждый воркер читает её на каждой
+                   проверке прав; invalidate_policy() увеличивает её под flock,
+                   так что изменение админки видно всем воркерам на следующей же проверке.
+  policy         - неизменяемая матрица для одной версии: (role_id, resource_id) -> битовая
+                   маска прав, resource code -> id, id админских ролей. Пишется во временный
+                   файл и подменяется rename(), читатели мапят его read-only: страницы общие
+                   в page cache, память не растёт с числом воркеров. В заголовке - длина
+                   и crc32 содержимого: обрезанный или испорченный файл не принимается.
+
+Матрицу пересобирает первый воркер, которому понадобилась новая версия, остальные
+только мапят готовый файл. Поиск - bisect прямо по отображённым массивам, без копии в dict.
+Файлы стоит держать на tmpfs (/dev/shm): fsync не делается, после перезагрузки всё строится заново.
+"""
+import bisect
+import contextlib
+import mmap
+import os
+import struct
+import zlib
+
+from sqlalchemy.orm import Session
+
+from app.access.models import AccessRule, Resource, Role
+from app.access.policy import mask_agg
+from app.core.shared_state import SharedCounter, open_private
+
+_MAGIC = b"PERMSNP2"
+# magic, version, длина файла, crc32 данных после заголовка,
+# число правил, число админских ролей, число ресурсов, ширина слота кода
+_HEADER = struct.Struct("=8sQQQQQQQ")
+
+class _Codes:
+    """Отсортированные коды ресурсов фиксированной ширины внутри mmap - последовательность для bisect."""
+    __slots__ = ("buf", "width", "count")
+
+    def __init__(self, buf: memoryview, width: int, count: int):
+        self.buf = buf
+        self.width = width
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> bytes:
+        return bytes(self.buf[i * self.width:(i + 1) * self.width])
+
+class SnapshotMatrix:
+    """Тот же интерфейс, что у PolicyMatrix, но данные читаются из отображённого файла."""
+    def __init__(self, mm: mmap.mmap):
+        if len(mm) < _HEADER.size:
+            raise ValueError("not a policy snapshot")
+        magic, self.version, length, crc, n_rules, n_admin, n_codes, width = _HEADER.unpack_from(mm, 0)
+        view = memoryview(mm)
+        if magic != _MAGIC or length != len(mm) or crc != zlib.crc32(view[_HEADER.size:]):
+            raise ValueError("not a policy snapshot")
+        offset = _HEADER.size
+        self._keys = view[offset:offset + 8 * n_rules].cast("Q")
+        offset += 8 * n_rules
+        self._admin = view[offset:offset + 8 * n_admin].cast("Q")
+        offset += 8 * n_admin
+        self._code_ids = view[offset:offset + 8 * n_codes].cast("Q")
+        offset += 8 * n_codes
+        self._codes = _Codes(view[offset:offset + width * n_codes], width, n_codes)
+        offset += width * n_codes
+        self._masks = view[offset:offset + n_rules]
+
+    def resource_id(self, resource_code: str) -> int | None:
+        encoded = resource_code.encode()
+        if len(encoded) > self._codes.width:
+            return None
+        slot = encoded.ljust(self._codes.width, b"\0")
+        i = bisect.bisect_left(self._codes, slot)
+        if i < len(self._codes) and self._codes[i] == slot:
+            return self._code_ids[i]
+        return None
+
+    def mask(self, role_ids: tuple[int, ...], resource_id: int) -> int:
+        keys = self._keys
+        result = 0
+        for role_id in role_ids:
+            key = role_id << 32 | resource_id
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                result |= self._masks[i]
+        return result
+
+    def effective(self, role_ids: tuple[int, ...], resource_code: str) -> int:
+        resource_id = self.resource_id(resource_code)
+        if resource_id is None:
+            return 0
+        return self.mask(role_ids, resource_id)
+
+    def has_admin(self, role_ids: tuple[int, ...]) -> bool:
+        admin = self._admin
+        for role_id in role_ids:
+            i = bisect.bisect_left(admin, role_id)
+            if i < len(admin) and admin[i] == role_id:
+                return True
+        return False
+
+def build_snapshot(db: Session, version: int) -> bytes:
+    rows = db.query(AccessRule.role_id, AccessRule.resource_id, mask_agg(db)).group_by(
+        AccessRule.role_id, AccessRule.resource_id,
+    )
+    masks = {role_id << 32 | resource_id: mask for role_id, resource_id, mask in rows if mask}
+    admin = sorted(r[0] for r in db.query(Role.id).filter(Role.name == "admin").all())
+    codes = sorted((code.encode(), resource_id) for resource_id, code in db.query(Resource.id, Resource.code).all())
+    width = max((len(c) for c, _ in codes), default=0)
+    # выравнивание: массивы Q идут первыми, слоты кодов и маски (по байту) - в конце
+    keys = sorted(masks)
+    body = b"".join((
+        struct.pack(f"={len(keys)}Q", *keys),
+        struct.pack(f"={len(admin)}Q", *admin),
+        struct.pack(f"={len(codes)}Q", *(resource_id for _, resource_id in codes)),
+        b"".join(c.ljust(width, b"\0") for c, _ in codes),
+        bytes(masks[k] for k in keys),
+    ))
+    header = _HEADER.pack(
+        _MAGIC, version, _HEADER.size + len(body), zlib.crc32(body), len(keys), len(admin), len(codes), width,
+    )
+    return header + body
+
+class SharedSnapshot:
+    def __init__(self, path: str):
+        self.path = path
+        self._counter = SharedCounter(f"{path}.version")
+        self._matrix: SnapshotMatrix | None = None
+
+    def version(self) -> int:
+        return self._counter.value()
+
+    def bump(self):
+        self._counter.bump()
+
+    def mapped(self, version: int) -> SnapshotMatrix | None:
+        """Матрица версии version, если она уже опубликована; без БД."""
+        m = self._matrix
+        if m is not None and m.version == version:
+            return m
+        try:
+            fd = open_private(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            m = SnapshotMatrix(mmap.mmap(fd, 0, access=mmap.ACCESS_READ))
+        except ValueError:
+            return None
+        finally:
+            os.close(fd)
+        # старый mmap освободится, когда на него не останется ссылок
+        self._matrix = m
+        return m if m.version == version else None
+
+    def load(self, db: Session, version: int) -> SnapshotMatrix:
+        m = self.mapped(version)
+        if m is not None:
+            return m
+        with self._counter.locked():
+            # пока ждали lock, файл мог опубликовать другой воркер
+            m = self.mapped(version)
+            if m is not None:
+                return m
+            # версию берём под lock: данные читаются после неё, так что они не старше
+            data = build_snapshot(db, self.version())
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            # остаток упавшего процесса с тем же pid; unlink убирает и symlink, не следуя ему
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp)
+            with os.fdopen(open_private(tmp, os.O_WRONLY, create=True), "wb") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        m = self.mapped(version)
+        # между build и нашей проверкой версия могла снова вырасти - матрица всё равно свежее version
+        return m if m is not None else self._matrix
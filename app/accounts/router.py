@@ -1,11 +1,18 @@
+from functools import lru_cache
+from ipaddress import ip_address, ip_network
+
 from fastapi import APIRouter, Depends, Request, Response, HTTPException, status
-from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core.database import AnySession, get_db
 from app.core.config import settings
+from app.core.etag import make_etag, matches, not_modified
+from app.core.rate_limit import RateLimiter, login_limiter, register_limiter
 from app.core.security import create_jwt
 from .schemas import RegisterIn, LoginIn, LoginOut, UserOut, UpdateMeIn
-from .service import create_user, authenticate_user, create_session, revoke_session, update_user, soft_delete_user
+from .service import (
+    create_user_async, authenticate_user_async, create_session_async, revoke_session_async,
+    update_user_async, soft_delete_user_async,
+)
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -15,21 +22,58 @@ def require_user(request: Request):
         raise HTTPException(status_code=401, detail="Unauthorized")
     return user
 
+_TRUSTED_PROXIES = tuple(
+    ip_network(item.strip(), strict=False) for item in settings.trusted_proxies.split(",") if item.strip()
+)
+
+@lru_cache(maxsize=1024)
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in _TRUSTED_PROXIES)
+
+def client_ip(request: Request) -> str | None:
+    host = request.client.host if request.client else None
+    if host is None or not _is_trusted_proxy(host):
+        return host
+    # каждый прокси дописывает адрес справа; левее первого недоверенного - то, что прислал клиент
+    hops = [hop.strip() for value in request.headers.getlist("X-Forwarded-For") for hop in value.split(",")]
+    hops = [hop for hop in hops if hop]
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            return hop
+    # вся цепочка из доверенных адресов - клиент внутри сети, это самый левый
+    return hops[0] if hops else host
+
+def enforce_rate_limit(limiter: RateLimiter, request: Request, email: str):
+    # до БД и bcrypt: лишняя попытка стоит только проверки ведра
+    wait = limiter.check(client_ip(request), email)
+    if wait:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Слишком много попыток, повторите позже",
+            headers={"Retry-After": str(max(1, round(wait)))},
+        )
+
 @router.post("/register", response_model=UserOut, status_code=201)
-def register(data: RegisterIn, db: Session = Depends(get_db)):
+async def register(data: RegisterIn, request: Request, db: AnySession = Depends(get_db)):
+    enforce_rate_limit(register_limiter, request, data.email)
     if data.password != data.password2:
         raise HTTPException(status_code=400, detail="Пароли не совпадают")
-    user = create_user(db, data.full_name, data.email, data.password)
+    user = await create_user_async(db, data.full_name, data.email, data.password)
     return UserOut.model_validate(user, from_attributes=True)
 
 @router.post("/login", response_model=LoginOut)
-def login(data: LoginIn, request: Request, response: Response, db: Session = Depends(get_db)):
-    user = authenticate_user(db, data.email, data.password)
+async def login(data: LoginIn, request: Request, response: Response, db: AnySession = Depends(get_db)):
+    enforce_rate_limit(login_limiter, request, data.email)
+    user = await authenticate_user_async(db, data.email, data.password)
 
-    ip = request.headers.get("X-Forwarded-For", "").split(",")[0].strip() or request.client.host
+    ip = client_ip(request)
     ua = request.headers.get("User-Agent")
 
-    sess = create_session(db, user, ip, ua)
+    sess = await create_session_async(db, user, ip, ua)
     token = create_jwt(uid=user.id, sid=sess.id)
 
     max_age = settings.session_expire_days * 24 * 60 * 60  # секунды
@@ -46,31 +90,37 @@ def login(data: LoginIn, request: Request, response: Response, db: Session = Dep
     return LoginOut(user=UserOut.model_validate(user, from_attributes=True), token=token)
 
 @router.post("/logout", status_code=204)
-def logout(request: Request, response: Response, db: Session = Depends(get_db)):
+async def logout(request: Request, response: Response, db: AnySession = Depends(get_db)):
     user = require_user(request)
     sess = getattr(request.state, "session", None)
 
     if sess:
-        revoke_session(db, sess)
+        await revoke_session_async(db, sess)
 
     response.delete_cookie(settings.cookie_name)
     return Response(status_code=204)
 
 @router.get("/me", response_model=UserOut)
-def me(request: Request):
+async def me(request: Request, response: Response):
     user = require_user(request)
+    # версия пользователя - updated_at (его двигают update_user и soft_delete_user);
+    # пользователь уже загружен AuthMiddleware, так что 304 обходится без БД
+    etag = make_etag(f"user-{user.id}", int(user.updated_at.timestamp() * 1_000_000), request)
+    if matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return UserOut.model_validate(user, from_attributes=True)
 
 @router.patch("/me", response_model=UserOut)
-def update_me(data: UpdateMeIn, request: Request, db: Session = Depends(get_db)):
+async def update_me(data: UpdateMeIn, request: Request, db: AnySession = Depends(get_db)):
     user = require_user(request)
-    user = update_user(db, user, data.full_name, data.email)
+    user = await update_user_async(db, user, data.full_name, data.email)
     return UserOut.model_validate(user, from_attributes=True)
 
 @router.delete("/me", status_code=204)
-def delete_me(request: Request, response: Response, db: Session = Depends(get_db)):
+async def delete_me(request: Request, response: Response, db: AnySession = Depends(get_db)):
     user = require_user(request)
     # soft delete + logout
-    soft_delete_user(db, user)
+    await soft_delete_user_async(db, user)
     response.delete_cookie(settings.cookie_name)
     return Response(status_code=204)
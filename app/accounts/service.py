@@ -2,27 +2,42 @@ from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from datetime import datetime, timezone
 
-from app.core.security import hash_password, verify_password, session_expires_at
+from app.core.database import AnySession, run_db
+from app.core.metrics import logins, registrations
+from app.core.password_hasher import PasswordHasherBusy, password_hasher
+from app.core.security import needs_rehash, session_expires_at
 from .models import User, Session as DbSession
+from .session_cache import session_cache
 
-def create_user(db: Session, full_name: str, email: str, password: str) -> User:
-    email = email.lower()
+def _ensure_email_free(db: Session, email: str):
     exists = db.query(User).filter(User.email == email).first()
     if exists:
         raise HTTPException(status_code=400, detail="Email уже зарегистрирован")
 
-    user = User(full_name=full_name, email=email, password_hash=hash_password(password), is_active=True)
+def _insert_user(db: Session, full_name: str, email: str, password_hash: str) -> User:
+    user = User(full_name=full_name, email=email, password_hash=password_hash, is_active=True)
     db.add(user)
     db.commit()
     db.refresh(user)
     return user
 
-def authenticate_user(db: Session, email: str, password: str) -> User:
-    email = email.lower()
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not user.is_active or not verify_password(password, user.password_hash):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверные данные")
-    return user
+def _get_user_by_email(db: Session, email: str) -> User | None:
+    return db.query(User).filter(User.email == email).first()
+
+def _set_password_hash(db: Session, user: User, password_hash: str):
+    user.password_hash = password_hash
+    db.add(user)
+    db.commit()
+
+def _invalid_credentials() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверные данные")
+
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Сервер перегружен, повторите попытку позже",
+        headers={"Retry-After": "1"},
+    )
 
 def create_session(db: Session, user: User, ip: str | None, user_agent: str | None) -> DbSession:
     sess = DbSession(
@@ -40,6 +55,7 @@ def revoke_session(db: Session, sess: DbSession):
     sess.revoked_at = datetime.now(timezone.utc)
     db.add(sess)
     db.commit()
+    session_cache.evict_session(sess.id)
 
 def revoke_all_sessions(db: Session, user_id: int):
     now = datetime.now(timezone.utc)
@@ -47,6 +63,7 @@ def revoke_all_sessions(db: Session, user_id: int):
         {"revoked_at": now}, synchronize_session=False
     )
     db.commit()
+    session_cache.evict_user(user_id)
 
 def update_user(db: Session, user: User, full_name: str | None, email: str | None) -> User:
     if email is not None:
@@ -63,6 +80,7 @@ def update_user(db: Session, user: User, full_name: str | None, email: str | Non
     db.add(user)
     db.commit()
     db.refresh(user)
+    session_cache.evict_user(user.id)
     return user
 
 def soft_delete_user(db: Session, user: User):
@@ -70,4 +88,69 @@ def soft_delete_user(db: Session, user: User):
     user.updated_at = datetime.now(timezone.utc)
     db.add(user)
     db.commit()
+    session_cache.evict_user(user.id)
     revoke_all_sessions(db, user.id)
+
+# ---- для роутов ----
+# Работают и с Session, и с AsyncSession (см. run_db). bcrypt уходит в выделенный пул
+# password_hasher; если его очередь заполнена - отвечаем 503 ещё до похода в БД.
+
+async def create_user_async(db: AnySession, full_name: str, email: str, password: str) -> User:
+    if password_hasher.is_full():
+        registrations.inc("busy")
+        raise _hasher_busy()
+    email = email.lower()
+    try:
+        await run_db(db, _ensure_email_free, email)
+    except HTTPException:
+        registrations.inc("conflict")
+        raise
+    try:
+        password_hash = await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        registrations.inc("busy")
+        raise _hasher_busy()
+    user = await run_db(db, _insert_user, full_name, email, password_hash)
+    registrations.inc("ok")
+    return user
+
+async def authenticate_user_async(db: AnySession, email: str, password: str) -> User:
+    if password_hasher.is_full():
+        logins.inc("busy")
+        raise _hasher_busy()
+    user = await run_db(db, _get_user_by_email, email.lower())
+    if not user or not user.is_active:
+        logins.inc("invalid")
+        raise _invalid_credentials()
+    try:
+        ok = await password_hasher.verify(password, user.password_hash)
+    except PasswordHasherBusy:
+        logins.inc("busy")
+        raise _hasher_busy()
+    if not ok:
+        logins.inc("invalid")
+        raise _invalid_credentials()
+    logins.inc("ok")
+    # сменилась BCRYPT_ROUNDS -> перехешируем; под нагрузкой просто откладываем до следующего логина
+    if needs_rehash(user.password_hash) and not password_hasher.is_full():
+        try:
+            new_hash = await password_hasher.hash(password)
+        except PasswordHasherBusy:
+            return user
+        await run_db(db, _set_password_hash, user, new_hash)
+    return user
+
+async def create_session_async(db: AnySession, user: User, ip: str | None, user_agent: str | None) -> DbSession:
+    return await run_db(db, create_session, user, ip, user_agent)
+
+async def revoke_session_async(db: AnySession, sess: DbSession):
+    await run_db(db, revoke_session, sess)
+
+async def revoke_all_sessions_async(db: AnySession, user_id: int):
+    await run_db(db, revoke_all_sessions, user_id)
+
+async def update_user_async(db: AnySession, user: User, full_name: str | None, email: str | None) -> User:
+    return await run_db(db, update_user, user, full_name, email)
+
+async def soft_delete_user_async(db: AnySession, user: User):
+    await run_db(db, soft_delete_user, user)
@@ -0,0 +1,190 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core.config import settings
+from app.core.shared_state import SharedLog, shared_log
+from .models import User, Session as DbSession
+
+_USER_COLUMNS = tuple(a.key for a in inspect(User).column_attrs)
+_SESSION_COLUMNS = tuple(a.key for a in inspect(DbSession).column_attrs)
+
+def _snapshot(obj, columns: tuple[str, ...]) -> dict:
+    return {k: getattr(obj, k) for k in columns}
+
+def _detached(model, data: dict):
+    obj = model(**data)
+    make_transient_to_detached(obj)
+    return obj
+
+_ALL = b"*"
+
+def _session_key(sid: str) -> bytes:
+    return b"s:" + sid.encode()
+
+def _user_key(user_id: int) -> bytes:
+    return b"u:%d" % user_id
+
+class CachedPrincipal:
+    """
+    Снимок (user, session, principal) без привязки к ORM-сессии.
+    На каждый hit собираются свежие detached-объекты: разные запросы никогда
+    не делят один экземпляр, а db.add(user) в сервисах работает как UPDATE.
+    """
+    __slots__ = ("user_id", "user_data", "session_data", "principal", "deadline")
+
+    def __init__(self, user: User, sess: DbSession, principal, deadline: float):
+        self.user_id = user.id
+        self.user_data = _snapshot(user, _USER_COLUMNS)
+        self.session_data = _snapshot(sess, _SESSION_COLUMNS)
+        # неизменяемый app.access.principal.Principal, отдаётся как есть
+        self.principal = principal
+        self.deadline = deadline
+
+    def materialize(self) -> tuple:
+        user = _detached(User, self.user_data)
+        sess = _detached(DbSession, self.session_data)
+        set_committed_value(sess, "user", user)
+        return user, sess, self.principal
+
+class SessionCache:
+    """
+    LRU + TTL кэш: sid -> CachedPrincipal.
+    Запись живёт не дольше ttl и не дольше самой сессии. Отзыв сессии, удаление или изменение
+    пользователя обязаны вызвать evict_*. С revocations (общий журнал воркеров) evict публикует
+    в него sid или id пользователя, и каждый воркер перед выдачей из кэша убирает только эти
+    записи - отзыв действует сразу везде, остальной кэш не трогается. Если воркер отстал
+    больше чем на размер журнала, он сбрасывает кэш целиком. Без журнала - только в текущем процессе.
+    """
+    def __init__(self, max_size: int, ttl_seconds: float, revocations: SharedLog | None = None):
+        self.max_size = max_size
+        self.revocations = revocations
+        self.ttl = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, CachedPrincipal] = OrderedDict()
+        self._by_user: dict[int, set[str]] = {}
+        # без журнала: растёт при каждом evict, не даём положить в кэш то, что прочитано из БД до отзыва
+        self._generation = 0
+        # номер последней применённой записи журнала
+        self._seen = revocations.seq() if revocations is not None else 0
+
+    @property
+    def generation(self) -> int:
+        """Снимать до чтения из БД и передавать в put()."""
+        if self.revocations is not None:
+            return self.revocations.seq()
+        return self._generation
+
+    def get(self, sid: str) -> CachedPrincipal | None:
+        with self._lock:
+            self._sync()
+            entry = self._entries.get(sid)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.deadline <= time.monotonic():
+                self._drop(sid)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(sid)
+            self.hits += 1
+            return entry
+
+    def put(self, user: User, sess: DbSession, principal, generation: int):
+        if self.ttl <= 0:
+            return
+        remaining = (sess.expires_at - datetime.now(timezone.utc)).total_seconds()
+        if remaining <= 0:
+            return
+        entry = CachedPrincipal(user, sess, principal, time.monotonic() + min(self.ttl, remaining))
+        with self._lock:
+            if self._revoked_since(generation, sess.id, entry.user_id):
+                return
+            self._sync()
+            self._drop(sess.id)
+            self._entries[sess.id] = entry
+            self._by_user.setdefault(entry.user_id, set()).add(sess.id)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def evict_session(self, sid: str):
+        with self._lock:
+            self._generation += 1
+            self._drop(sid)
+        self._publish(_session_key(sid))
+
+    def evict_user(self, user_id: int):
+        with self._lock:
+            self._generation += 1
+            self._drop_user(user_id)
+        self._publish(_user_key(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._clear()
+        self._publish(_ALL)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _publish(self, key: bytes):
+        if self.revocations is not None:
+            self.revocations.append(key if len(key) <= SharedLog.KEY_SIZE else _ALL)
+
+    def _revoked_since(self, generation: int, sid: str, user_id: int) -> bool:
+        """Был ли отзыв, касающийся sid/user_id, после снятия generation."""
+        if self.revocations is None:
+            return generation != self._generation
+        _, keys = self.revocations.since(generation)
+        if keys is None:
+            return True
+        targets = (_ALL, _session_key(sid), _user_key(user_id))
+        return any(key in targets for key in keys)
+
+    def _sync(self):
+        # применить отзывы, опубликованные после прошлой проверки (в том числе другими воркерами)
+        if self.revocations is None:
+            return
+        self._seen, keys = self.revocations.since(self._seen)
+        if keys is None:
+            self._clear()
+            return
+        for key in keys:
+            if key == _ALL:
+                self._clear()
+            elif key.startswith(b"s:"):
+                self._drop(key[2:].decode())
+            elif key.startswith(b"u:"):
+                self._drop_user(int(key[2:]))
+
+    def _clear(self):
+        self._entries.clear()
+        self._by_user.clear()
+
+    def _drop_user(self, user_id: int):
+        for sid in list(self._by_user.get(user_id, ())):
+            self._drop(sid)
+
+    def _drop(self, sid: str):
+        entry = self._entries.pop(sid, None)
+        if entry is None:
+            return
+        sids = self._by_user.get(entry.user_id)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self._by_user[entry.user_id]
+
+session_cache = SessionCache(
+    max_size=settings.session_cache_size,
+    ttl_seconds=settings.session_cache_ttl_seconds,
+    revocations=shared_log("sessions.revocations"),
+)
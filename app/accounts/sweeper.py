@@ -0,0 +1,93 @@
+"""
+Очистка таблицы sessions от мёртвых строк: истёкших и давно отозванных.
+
+Запускается периодически из приложения (SESSION_SWEEP_INTERVAL_SECONDS) или вручную:
+
+    python -m app.accounts.sweeper --grace-hours 24 --batch-size 1000
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, or_, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, SessionLocal, is_async, run_db
+from .models import Session as DbSession
+
+logger = logging.getLogger(__name__)
+
+class SweepResult:
+    def __init__(self, deleted: int, batches: int, duration: float):
+        self.deleted = deleted
+        self.batches = batches
+        self.duration = duration
+
+    def __repr__(self):
+        return f"SweepResult(deleted={self.deleted}, batches={self.batches}, duration={self.duration:.3f}s)"
+
+def sweep_sessions(db: Session, grace: timedelta, batch_size: int) -> SweepResult:
+    """
+    Удаляет сессии с expires_at в прошлом или revoked_at старше grace.
+    Пачками по batch_size с commit после каждой: блокировки короткие, а чтение
+    сессий middleware не ждёт окончания всей чистки.
+    """
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    dead = or_(DbSession.expires_at < now, DbSession.revoked_at < now - grace)
+
+    deleted = 0
+    batches = 0
+    while True:
+        ids = db.execute(select(DbSession.id).where(dead).limit(batch_size)).scalars().all()
+        if not ids:
+            break
+        db.execute(delete(DbSession).where(DbSession.id.in_(ids)), execution_options={"synchronize_session": False})
+        db.commit()
+        deleted += len(ids)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+
+    return SweepResult(deleted, batches, time.perf_counter() - started)
+
+async def sweep_once() -> SweepResult:
+    grace = timedelta(hours=settings.session_sweep_grace_hours)
+    batch_size = settings.session_sweep_batch_size
+    if is_async:
+        async with AsyncSessionLocal() as db:
+            return await run_db(db, sweep_sessions, grace, batch_size)
+    db = SessionLocal()
+    try:
+        return await run_db(db, sweep_sessions, grace, batch_size)
+    finally:
+        db.close()
+
+async def run_periodically(interval_seconds: float):
+    """Фоновая задача приложения; ошибки логируются, цикл продолжается."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            result = await sweep_once()
+            logger.info("session sweep: deleted=%d batches=%d duration=%.3fs",
+                        result.deleted, result.batches, result.duration)
+        except Exception:
+            logger.exception("session sweep failed")
+
+def main():
+    parser = argparse.ArgumentParser(description="Удалить истёкшие и отозванные сессии")
+    parser.add_argument("--grace-hours", type=float, default=settings.session_sweep_grace_hours,
+                        help="сколько хранить отозванные сессии")
+    parser.add_argument("--batch-size", type=int, default=settings.session_sweep_batch_size)
+    args = parser.parse_args()
+
+    settings.session_sweep_grace_hours = args.grace_hours
+    settings.session_sweep_batch_size = args.batch_size
+    result = asyncio.run(sweep_once())
+    print(f"deleted={result.deleted} batches={result.batches} duration={result.duration:.3f}s")
+
+if __name__ == "__main__":
+    main()
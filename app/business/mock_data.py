@@ -1,3 +1,4 @@
+# исходные данные для сидирования таблиц products/orders
 PRODUCTS = [
     {"id": 1, "name": "Product A", "owner_id": 1},
     {"id": 2, "name": "Product B", "owner_id": 2},
@@ -0,0 +1,20 @@
+from sqlalchemy import String, ForeignKey, Integer, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.database import Base
+
+class Product(Base):
+    __tablename__ = "products"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(255))
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+
+    # (owner_id, id): выборка "только свои" + keyset-пагинация по одному индексу
+    __table_args__ = (Index("ix_products_owner_id_id", "owner_id", "id"),)
+
+class Order(Base):
+    __tablename__ = "orders"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    title: Mapped[str] = mapped_column(String(255))
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+
+    __table_args__ = (Index("ix_orders_owner_id_id", "owner_id", "id"),)
@@ -0,0 +1,56 @@
+from sqlalchemy import ColumnElement, delete, update
+from sqlalchemy.orm import Session
+
+from app.core.pagination import keyset_page
+from .models import Product, Order
+
+class Repository:
+    """
+    Доступ к таблице бизнес-объектов. Выборки принимают условие авторизации
+    (service.authz_filter) и выполняют его в SQL вместе с пагинацией.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def get(self, db: Session, obj_id: int):
+        return db.get(self.model, obj_id)
+
+    def page(self, db: Session, where: ColumnElement[bool], after_id: int | None, limit: int) -> tuple[list, int | None]:
+        # "только свои" ложится на индекс (owner_id, id)
+        return keyset_page(db.query(self.model).filter(where), self.model, after_id, limit)
+
+    def create(self, db: Session, owner_id: int, data: dict):
+        obj = self.model(owner_id=owner_id, **data)
+        db.add(obj)
+        db.commit()
+        db.refresh(obj)
+        return obj
+
+    def update(self, db: Session, obj, data: dict):
+        for k, v in data.items():
+            setattr(obj, k, v)
+        db.commit()
+        db.refresh(obj)
+        return obj
+
+    def delete(self, db: Session, obj):
+        db.delete(obj)
+        db.commit()
+
+    # массовые операции: одна инструкция, строки без прав просто не попадают под WHERE
+
+    def update_many(self, db: Session, where: ColumnElement[bool], ids: list[int], data: dict) -> int:
+        stmt = update(self.model).where(self.model.id.in_(ids), where).values(**data)
+        affected = db.execute(stmt, execution_options={"synchronize_session": False}).rowcount
+        db.commit()
+        return affected
+
+    def delete_many(self, db: Session, where: ColumnElement[bool], ids: list[int]) -> int:
+        stmt = delete(self.model).where(self.model.id.in_(ids), where)
+        affected = db.execute(stmt, execution_options={"synchronize_session": False}).rowcount
+        db.commit()
+        return affected
+
+products = Repository(Product)
+orders = Repository(Order)
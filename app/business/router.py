@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, Request, HTTPException
-from sqlalchemy.orm import Session
-
-from app.core.database import get_db
-from app.access.service import can
-from .mock_data import PRODUCTS, ORDERS
+from fastapi import APIRouter, Depends, Query, Request, Response, HTTPException
+
+from app.core.database import AnySession, get_db, get_read_db, run_db
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, set_cursor
+from app.core.serialization import rows_response
+from app.access.principal import get_principal
+from app.access.service import authz_filter_async, can_async, effective_permissions_async
+from .repository import Repository, products, orders
+from .schemas import (
+    ProductIn, ProductOut, ProductBulkUpdateIn, OrderIn, OrderOut, OrderBulkUpdateIn,
+    BulkDeleteIn, BulkResult,
+)
 
 router = APIRouter(prefix="/api", tags=["business"])
 
@@ -13,70 +19,118 @@ def require_user(request: Request):
         raise HTTPException(status_code=401, detail="Unauthorized")
     return user
 
-def filter_by_owner(items: list[dict], user_id: int):
-    return [x for x in items if x.get("owner_id") == user_id]
-
-# ---- PRODUCTS ----
-@router.get("/products")
-def list_products(request: Request, db: Session = Depends(get_db)):
+async def _list(request: Request, db: AnySession, repo: Repository, schema, resource: str,
+                after_id: int | None, limit: int) -> Response:
     user = require_user(request)
 
-    if not can(db, user.id, "products", "read", owner_id=None):
+    perms = await effective_permissions_async(db, user.id, resource, principal=get_principal(request))
+    if not perms.allows("read", owner_id=None):
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    # если есть read_all -> вернём все, иначе только свои
-    if can(db, user.id, "products", "read", owner_id=user.id + 10_000):
-        return PRODUCTS
-    return filter_by_owner(PRODUCTS, user.id)
+    # read_all -> без ограничений, иначе только свои; решение уходит в WHERE
+    where = perms.where("read", repo.model.owner_id)
+    items, next_cursor = await run_db(db, repo.page, where, after_id, limit)
+    # строки из своей БД: сразу в JSON, без повторной валидации через response_model
+    response = rows_response(schema, items)
+    set_cursor(response, next_cursor)
+    return response
 
-@router.get("/products/{pid}")
-def get_product(pid: int, request: Request, db: Session = Depends(get_db)):
+async def _get_allowed(request: Request, db: AnySession, repo: Repository, resource: str, action: str, obj_id: int):
     user = require_user(request)
-    obj = next((x for x in PRODUCTS if x["id"] == pid), None)
+    obj = await run_db(db, repo.get, obj_id)
     if not obj:
         raise HTTPException(404, "Not found")
 
-    if not can(db, user.id, "products", "read", owner_id=obj["owner_id"]):
+    if not await can_async(db, user.id, resource, action, owner_id=obj.owner_id, principal=get_principal(request)):
         raise HTTPException(status_code=403, detail="Forbidden")
     return obj
 
-@router.post("/products")
-def create_product(request: Request, db: Session = Depends(get_db)):
+async def _create(request: Request, db: AnySession, repo: Repository, resource: str, data: dict):
     user = require_user(request)
-    if not can(db, user.id, "products", "create", owner_id=None):
+    if not await can_async(db, user.id, resource, "create", owner_id=None, principal=get_principal(request)):
         raise HTTPException(status_code=403, detail="Forbidden")
-    return {"detail": "Created (mock)", "owner_id": user.id}
+    return await run_db(db, repo.create, user.id, data)
 
-@router.patch("/products/{pid}")
-def update_product(pid: int, request: Request, db: Session = Depends(get_db)):
+async def _update_many(request: Request, db: AnySession, repo: Repository, resource: str, ids: list[int], data: dict):
     user = require_user(request)
-    obj = next((x for x in PRODUCTS if x["id"] == pid), None)
-    if not obj:
-        raise HTTPException(404, "Not found")
+    where = await authz_filter_async(db, user.id, resource, "update", repo.model.owner_id, principal=get_principal(request))
+    return BulkResult(affected=await run_db(db, repo.update_many, where, ids, data))
 
-    if not can(db, user.id, "products", "update", owner_id=obj["owner_id"]):
-        raise HTTPException(status_code=403, detail="Forbidden")
-    return {"detail": "Updated (mock)", "id": pid}
-
-@router.delete("/products/{pid}", status_code=204)
-def delete_product(pid: int, request: Request, db: Session = Depends(get_db)):
+async def _delete_many(request: Request, db: AnySession, repo: Repository, resource: str, ids: list[int]):
     user = require_user(request)
-    obj = next((x for x in PRODUCTS if x["id"] == pid), None)
-    if not obj:
-        raise HTTPException(404, "Not found")
+    where = await authz_filter_async(db, user.id, resource, "delete", repo.model.owner_id, principal=get_principal(request))
+    return BulkResult(affected=await run_db(db, repo.delete_many, where, ids))
 
-    if not can(db, user.id, "products", "delete", owner_id=obj["owner_id"]):
-        raise HTTPException(status_code=403, detail="Forbidden")
+# ---- PRODUCTS ----
+@router.get("/products", response_model=list[ProductOut])
+async def list_products(
+    request: Request,
+    after_id: int | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AnySession = Depends(get_read_db),
+):
+    return await _list(request, db, products, ProductOut, "products", after_id, limit)
+
+@router.patch("/products", response_model=BulkResult)
+async def update_products(data: ProductBulkUpdateIn, request: Request, db: AnySession = Depends(get_db)):
+    return await _update_many(request, db, products, "products", data.ids, data.model_dump(exclude={"ids"}))
+
+@router.post("/products/bulk-delete", response_model=BulkResult)
+async def delete_products(data: BulkDeleteIn, request: Request, db: AnySession = Depends(get_db)):
+    return await _delete_many(request, db, products, "products", data.ids)
+
+@router.get("/products/{pid}", response_model=ProductOut)
+async def get_product(pid: int, request: Request, db: AnySession = Depends(get_read_db)):
+    return await _get_allowed(request, db, products, "products", "read", pid)
+
+@router.post("/products", response_model=ProductOut, status_code=201)
+async def create_product(data: ProductIn, request: Request, db: AnySession = Depends(get_db)):
+    return await _create(request, db, products, "products", data.model_dump())
+
+@router.patch("/products/{pid}", response_model=ProductOut)
+async def update_product(pid: int, data: ProductIn, request: Request, db: AnySession = Depends(get_db)):
+    obj = await _get_allowed(request, db, products, "products", "update", pid)
+    return await run_db(db, products.update, obj, data.model_dump())
+
+@router.delete("/products/{pid}", status_code=204)
+async def delete_product(pid: int, request: Request, db: AnySession = Depends(get_db)):
+    obj = await _get_allowed(request, db, products, "products", "delete", pid)
+    await run_db(db, products.delete, obj)
     return None
 
 # ---- ORDERS (аналогично) ----
-@router.get("/orders")
-def list_orders(request: Request, db: Session = Depends(get_db)):
-    user = require_user(request)
-
-    if not can(db, user.id, "orders", "read", owner_id=None):
-        raise HTTPException(status_code=403, detail="Forbidden")
-
-    if can(db, user.id, "orders", "read", owner_id=user.id + 10_000):
-        return ORDERS
-    return filter_by_owner(ORDERS, user.id)
+@router.get("/orders", response_model=list[OrderOut])
+async def list_orders(
+    request: Request,
+    after_id: int | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AnySession = Depends(get_read_db),
+):
+    return await _list(request, db, orders, OrderOut, "orders", after_id, limit)
+
+@router.patch("/orders", response_model=BulkResult)
+async def update_orders(data: OrderBulkUpdateIn, request: Request, db: AnySession = Depends(get_db)):
+    return await _update_many(request, db, orders, "orders", data.ids, data.model_dump(exclude={"ids"}))
+
+@router.post("/orders/bulk-delete", response_model=BulkResult)
+async def delete_orders(data: BulkDeleteIn, request: Request, db: AnySession = Depends(get_db)):
+    return await _delete_many(request, db, orders, "orders", data.ids)
+
+@router.get("/orders/{oid}", response_model=OrderOut)
+async def get_order(oid: int, request: Request, db: AnySession = Depends(get_read_db)):
+    return await _get_allowed(request, db, orders, "orders", "read", oid)
+
+@router.post("/orders", response_model=OrderOut, status_code=201)
+async def create_order(data: OrderIn, request: Request, db: AnySession = Depends(get_db)):
+    return await _create(request, db, orders, "orders", data.model_dump())
+
+@router.patch("/orders/{oid}", response_model=OrderOut)
+async def update_order(oid: int, data: OrderIn, request: Request, db: AnySession = Depends(get_db)):
+    obj = await _get_allowed(request, db, orders, "orders", "update", oid)
+    return await run_db(db, orders.update, obj, data.model_dump())
+
+@router.delete("/orders/{oid}", status_code=204)
+async def delete_order(oid: int, request: Request, db: AnySession = Depends(get_db)):
+    obj = await _get_allowed(request, db, orders, "orders", "delete", oid)
+    await run_db(db, orders.delete, obj)
+    return None
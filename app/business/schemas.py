@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Field
+
+class ProductIn(BaseModel):
+    name: str = Field(min_length=1, max_length=255)
+
+class ProductOut(ProductIn):
+    id: int
+    owner_id: int
+
+class OrderIn(BaseModel):
+    title: str = Field(min_length=1, max_length=255)
+
+class OrderOut(OrderIn):
+    id: int
+    owner_id: int
+
+# массовые операции над своими/чужими строками: права проверяются в WHERE
+MAX_BULK_IDS = 1000
+
+class BulkDeleteIn(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=MAX_BULK_IDS)
+
+class ProductBulkUpdateIn(ProductIn):
+    ids: list[int] = Field(min_length=1, max_length=MAX_BULK_IDS)
+
+class OrderBulkUpdateIn(OrderIn):
+    ids: list[int] = Field(min_length=1, max_length=MAX_BULK_IDS)
+
+class BulkResult(BaseModel):
+    affected: int
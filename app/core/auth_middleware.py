@@ -1,70 +1,134 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+import anyio
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Receive, Scope, Send
 from sqlalchemy.orm import Session as OrmSession
 
-from app.accounts.models import Session as DbSession
+from app.accounts.session_cache import session_cache
+from app.access.principal import load_principal_checked
 from app.core.config import settings
+from app.core.database import current_client
+from app.core.instrumentation import phase
+from app.core.metrics import auth_outcomes
 from app.core.security import decode_jwt
 
-class AuthMiddleware(BaseHTTPMiddleware):
+class AuthMiddleware:
     """
-    Ставит request.state.user и request.state.session, если пользователь определён.
+    Ставит request.state.user, request.state.session и request.state.principal, если пользователь определён.
     Идентификация:
       1) Authorization: Bearer <jwt> (в jwt есть uid + sid) -> проверяем сессию в БД
       2) Cookie sessionid -> проверяем сессию в БД
+
+    Чистый ASGI: без учётных данных БД не трогаем вовсе. Запросы к БД не блокируют event loop:
+      - db_factory = sessionmaker: в отдельном ограниченном пуле потоков
+      - db_factory = async_sessionmaker: через AsyncSession.run_sync, без потоков
+    Сессия, пользователь, роли и права грузятся одним запросом (load_principal);
+    разрешённые сессии кэшируются (session_cache), повторные запросы с той же сессией БД не трогают.
+    Сессии проверяются только на primary: отставшая реплика вернула бы только что отозванную сессию,
+    и она осталась бы в кэше на весь ttl.
     """
-    def __init__(self, app, db_factory):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, db_factory, max_threads: int | None = None):
+        self.app = app
         self.db_factory = db_factory
+        self.is_async = isinstance(db_factory, async_sessionmaker)
+        self.limiter = anyio.CapacityLimiter(max_threads or settings.auth_db_threads)
 
-    async def dispatch(self, request: Request, call_next):
-        request.state.user = None
-        request.state.session = None
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        db: OrmSession = self.db_factory()
-        try:
-            # 1) Bearer JWT
-            auth = request.headers.get("Authorization", "")
-            if auth.startswith("Bearer "):
-                token = auth[7:].strip()
-                user_session = self._auth_by_jwt(db, token)
-                if user_session:
-                    user, sess = user_session
-                    request.state.user = user
-                    request.state.session = sess
-                    return await call_next(request)
+        state = scope.setdefault("state", {})
+        state["user"] = None
+        state["session"] = None
+        state["principal"] = None
 
-            # 2) Cookie sessionid
-            sid = request.cookies.get(settings.cookie_name)
-            if sid:
-                user_session = self._auth_by_session(db, sid)
-                if user_session:
-                    user, sess = user_session
-                    request.state.user = user
-                    request.state.session = sess
+        with phase("auth"):
+            payload, sid = self._credentials(scope)
+            resolved = self._from_cache(payload, sid)
+            if resolved is None and (payload or sid):
+                resolved = await self._load(self.db_factory, payload, sid)
+        if not resolved:
+            await self.app(scope, receive, send)
+            return
+        state["user"], state["session"], state["principal"] = resolved
+        # от него зависит, читать ли этому запросу с реплики (database.use_replica)
+        token = current_client.set(state["user"].id)
+        try:
+            await self.app(scope, receive, send)
         finally:
-            db.close()
+            current_client.reset(token)
 
-        return await call_next(request)
+    def _credentials(self, scope: Scope) -> tuple[dict | None, str | None]:
+        auth = ""
+        cookie = ""
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth = value.decode("latin-1")
+            elif name == b"cookie":
+                cookie = value.decode("latin-1")
 
-    def _auth_by_jwt(self, db: OrmSession, token: str):
-        try:
-            payload = decode_jwt(token)
-        except Exception:
-            return None
-        uid = payload.get("uid")
-        sid = payload.get("sid")
-        if not uid or not sid:
-            return None
+        # JWT проверяем прямо в loop: это только HMAC, а с невалидным токеном в БД идти незачем
+        payload = None
+        if auth.startswith("Bearer "):
+            try:
+                payload = decode_jwt(auth[7:].strip())
+            except Exception:
+                payload = None
+                auth_outcomes.inc("jwt_invalid")
+            if payload is not None and (not payload.get("uid") or not payload.get("sid")):
+                payload = None
 
-        sess = db.query(DbSession).filter(DbSession.id == sid, DbSession.user_id == uid).first()
-        if not sess or not sess.is_valid():
-            return None
-        return (sess.user, sess)
+        sid = cookie_parser(cookie).get(settings.cookie_name) if cookie else None
+        return payload, sid or None
 
-    def _auth_by_session(self, db: OrmSession, sid: str):
-        sess = db.query(DbSession).filter(DbSession.id == sid).first()
-        if not sess or not sess.is_valid():
+    def _from_cache(self, payload: dict | None, sid: str | None):
+        # тот же порядок, что и в _authenticate: сначала JWT, потом cookie;
+        # если JWT есть, но его сессии нет в кэше - идём в БД за полной проверкой
+        if payload:
+            entry = session_cache.get(payload["sid"])
+            if entry is not None and entry.user_id == payload["uid"]:
+                auth_outcomes.inc("jwt_ok")
+                return entry.materialize()
             return None
-        return (sess.user, sess)
+        if sid:
+            entry = session_cache.get(sid)
+            if entry is not None:
+                auth_outcomes.inc("cookie_ok")
+                return entry.materialize()
+        return None
+
+    async def _load(self, factory, payload: dict | None, sid: str | None):
+        if self.is_async:
+            async with factory() as db:
+                return await db.run_sync(self._authenticate, payload, sid)
+        return await anyio.to_thread.run_sync(self._authenticate_sync, factory, payload, sid, limiter=self.limiter)
+
+    def _authenticate_sync(self, factory, payload: dict | None, sid: str | None):
+        db: OrmSession = factory()
+        try:
+            return self._authenticate(db, payload, sid)
+        finally:
+            db.close()
+
+    def _authenticate(self, db: OrmSession, payload: dict | None, sid: str | None):
+        generation = session_cache.generation
+        resolved = self._authenticate_db(db, payload, sid)
+        if resolved:
+            session_cache.put(*resolved, generation=generation)
+        return resolved
+
+    def _authenticate_db(self, db: OrmSession, payload: dict | None, sid: str | None):
+        # 1) Bearer JWT
+        if payload:
+            resolved, outcome = load_principal_checked(db, payload["sid"], uid=payload["uid"])
+            auth_outcomes.inc("jwt_ok" if resolved else outcome)
+            if resolved:
+                return resolved
+
+        # 2) Cookie sessionid
+        if sid:
+            resolved, outcome = load_principal_checked(db, sid)
+            auth_outcomes.inc("cookie_ok" if resolved else outcome)
+            return resolved
+        return None
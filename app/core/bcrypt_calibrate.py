@@ -0,0 +1,58 @@
+"""
+Подбор BCRYPT_ROUNDS под текущую машину.
+
+    python -m app.core.bcrypt_calibrate --target-ms 250
+
+Для каждой стоимости меряет время verify (медиана по --samples попыткам)
+и рекомендует максимальную стоимость, которая укладывается в бюджет.
+"""
+import argparse
+import statistics
+import time
+
+import bcrypt
+
+def measure_verify(rounds: int, samples: int) -> float:
+    password = b"calibration-password"
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt.checkpw(password, hashed)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+def calibrate(target_ms: float, min_rounds: int, max_rounds: int, samples: int) -> tuple[int | None, list[tuple[int, float]]]:
+    results = []
+    recommended = None
+    for rounds in range(min_rounds, max_rounds + 1):
+        ms = measure_verify(rounds, samples)
+        results.append((rounds, ms))
+        if ms <= target_ms:
+            recommended = rounds
+        else:
+            # каждая следующая стоимость вдвое дороже - дальше мерить незачем
+            break
+    return recommended, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Подбор стоимости bcrypt под бюджет задержки verify")
+    parser.add_argument("--target-ms", type=float, default=250, help="бюджет на один verify, мс")
+    parser.add_argument("--min-rounds", type=int, default=4)
+    parser.add_argument("--max-rounds", type=int, default=16)
+    parser.add_argument("--samples", type=int, default=5)
+    args = parser.parse_args()
+
+    recommended, results = calibrate(args.target_ms, args.min_rounds, args.max_rounds, args.samples)
+    print(f"{'rounds':>6}  {'verify, ms':>10}")
+    for rounds, ms in results:
+        mark = "  <-" if rounds == recommended else ""
+        print(f"{rounds:>6}  {ms:>10.1f}{mark}")
+
+    if recommended is None:
+        print(f"\nДаже rounds={args.min_rounds} не укладывается в {args.target_ms} мс")
+    else:
+        print(f"\nРекомендация: BCRYPT_ROUNDS={recommended}")
+
+if __name__ == "__main__":
+    main()
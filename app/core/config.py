@@ -1,8 +1,27 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
 class Settings(BaseSettings):
     database_url: str = Field(alias="DATABASE_URL")
+    # реплика только для чтения (тот же драйвер, что и у DATABASE_URL); пусто - всё на primary
+    database_replica_url: str | None = Field(default=None, alias="DATABASE_REPLICA_URL")
+    # сколько секунд после своей записи пользователь читает с primary (лаг репликации)
+    db_replica_stick_seconds: float = Field(default=5, ge=0, alias="DB_REPLICA_STICK_SECONDS")
+
+    # пул соединений (для каждого engine отдельно)
+    db_pool_size: int = Field(default=10, ge=1, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(default=20, ge=0, alias="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(default=30, gt=0, alias="DB_POOL_TIMEOUT")
+    # пересоздавать соединения старше N секунд; -1 - никогда
+    db_pool_recycle: int = Field(default=1800, alias="DB_POOL_RECYCLE")
+    # SELECT 1 на каждый checkout: разорванное соединение заменяется до запроса, а не падает в нём
+    db_pool_pre_ping: bool = Field(default=True, alias="DB_POOL_PRE_PING")
+
+    # auto - при старте create_all + seed, если изменился отпечаток схемы (app/core/schema.py);
+    # off - ничего не делать, схема и данные готовятся через python -m app.core.schema migrate
+    db_bootstrap: Literal["auto", "off"] = Field(default="auto", alias="DB_BOOTSTRAP")
     secret_key: str = Field(default="change-me", alias="SECRET_KEY")
 
     jwt_expire_minutes: int = Field(default=60, alias="JWT_EXPIRE_MINUTES")
@@ -11,6 +30,54 @@ class Settings(BaseSettings):
     cookie_name: str = Field(default="sessionid", alias="COOKIE_NAME")
     cookie_secure: bool = Field(default=False, alias="COOKIE_SECURE")
 
+    # стоимость bcrypt; подобрать под железо: python -m app.core.bcrypt_calibrate
+    bcrypt_rounds: int = Field(default=12, ge=4, le=31, alias="BCRYPT_ROUNDS")
+
+    # выделенный пул для bcrypt: "thread" | "process"; workers 0 -> по числу CPU;
+    # при max_pending задачах в очереди логин/регистрация сразу получают 503
+    bcrypt_executor: str = Field(default="thread", alias="BCRYPT_EXECUTOR")
+    bcrypt_workers: int = Field(default=0, alias="BCRYPT_WORKERS")
+    bcrypt_max_pending: int = Field(default=64, alias="BCRYPT_MAX_PENDING")
+
+    # лимит попыток логина/регистрации за период (token bucket, app/core/rate_limit.py); 0 - без лимита
+    auth_rate_period_seconds: float = Field(default=60, gt=0, alias="AUTH_RATE_PERIOD_SECONDS")
+    login_rate_per_ip: int = Field(default=30, ge=0, alias="LOGIN_RATE_PER_IP")
+    login_rate_per_email: int = Field(default=10, ge=0, alias="LOGIN_RATE_PER_EMAIL")
+    register_rate_per_ip: int = Field(default=10, ge=0, alias="REGISTER_RATE_PER_IP")
+    register_rate_per_email: int = Field(default=3, ge=0, alias="REGISTER_RATE_PER_EMAIL")
+    # адреса/подсети обратных прокси через запятую (10.0.0.0/8,127.0.0.1); X-Forwarded-For читается,
+    # только если запрос пришёл от них. Пусто - IP клиента всегда адрес TCP-соединения
+    trusted_proxies: str = Field(default="", alias="TRUSTED_PROXIES")
+
+    # размер пула потоков, в котором AuthMiddleware ходит в БД
+    auth_db_threads: int = Field(default=16, alias="AUTH_DB_THREADS")
+
+    # кэш разрешённых сессий в AuthMiddleware (ttl 0 -> кэш выключен); logout/удаление убирают эту сессию
+    # (пользователя) во всех воркерах через SHARED_STATE_DIR, без него - только в своём процессе, в остальных до ttl
+    session_cache_size: int = Field(default=10_000, alias="SESSION_CACHE_SIZE")
+    session_cache_ttl_seconds: float = Field(default=30, alias="SESSION_CACHE_TTL_SECONDS")
+
+    # фоновая чистка sessions (interval 0 -> не запускать из приложения)
+    session_sweep_interval_seconds: float = Field(default=3600, alias="SESSION_SWEEP_INTERVAL_SECONDS")
+    session_sweep_grace_hours: float = Field(default=24, alias="SESSION_SWEEP_GRACE_HOURS")
+    session_sweep_batch_size: int = Field(default=1000, alias="SESSION_SWEEP_BATCH_SIZE")
+
+    # сколько пользователей держать в LRU-кэше user_id -> role_ids
+    policy_user_cache_size: int = Field(default=10_000, alias="POLICY_USER_CACHE_SIZE")
+    # общие для воркеров хоста счётчики и снимок политики (app/core/shared_state.py):
+    # auto - каталог в /dev/shm по DATABASE_URL; путь - свой каталог; пусто - только один воркер
+    shared_state_dir: str = Field(default="auto", alias="SHARED_STATE_DIR")
+
+    # Server-Timing (auth/authz/handler/db) и X-DB-Queries в каждом ответе - отладочные данные,
+    # видны любому клиенту, поэтому только для локальной отладки и нагрузочных стендов
+    server_timing: bool = Field(default=False, alias="SERVER_TIMING")
+    # запросы дольше порога пишутся в лог app.sql.slow; 0 - выключено
+    slow_query_ms: float = Field(default=0, ge=0, alias="SLOW_QUERY_MS")
+
+    # /metrics в формате Prometheus + гистограмма длительности запросов по маршрутам; эндпоинт
+    # без авторизации (маршруты, нагрузка, пул) - включать, только если он закрыт от внешнего трафика
+    metrics_enabled: bool = Field(default=False, alias="METRICS_ENABLED")
+
     class Config:
         env_file = ".env"
         extra = "ignore"
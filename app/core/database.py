@@ -1,16 +1,201 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine, event, DateTime
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from sqlalchemy.types import TypeDecorator
+from starlette.concurrency import run_in_threadpool
 from .config import settings
+from .instrumentation import instrument_engine
+from .metrics import db_pool_checkout_wait, registry
+
+# async-режим включается драйвером в DATABASE_URL:
+#   postgresql+asyncpg://...   sqlite+aiosqlite:///./local.db
+ASYNC_DRIVERS = {"asyncpg", "aiosqlite"}
+is_async = make_url(settings.database_url).get_driver_name() in ASYNC_DRIVERS
+
+def _engine_kwargs(url: str) -> dict:
+    kwargs = {"pool_pre_ping": settings.db_pool_pre_ping}
+    u = make_url(url)
+    # in-memory SQLite живёт на одном соединении - размеры пула к нему неприменимы
+    if u.get_backend_name() == "sqlite" and u.database in (None, "", ":memory:"):
+        return kwargs
+    kwargs.update(
+        poolclass=AsyncAdaptedQueuePool if is_async else QueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+    )
+    return kwargs
+
+replica_url = settings.database_replica_url
+if replica_url and (make_url(replica_url).get_driver_name() in ASYNC_DRIVERS) != is_async:
+    raise RuntimeError("DATABASE_REPLICA_URL должен использовать тот же (sync/async) драйвер, что и DATABASE_URL")
+
+if is_async:
+    async_engine = create_async_engine(settings.database_url, **_engine_kwargs(settings.database_url))
+    read_async_engine = create_async_engine(replica_url, **_engine_kwargs(replica_url)) if replica_url else async_engine
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    AsyncReadSessionLocal = async_sessionmaker(bind=read_async_engine, autoflush=False, expire_on_commit=False)
+    engine = async_engine.sync_engine
+    read_engine = read_async_engine.sync_engine
+else:
+    async_engine = read_async_engine = None
+    AsyncSessionLocal = AsyncReadSessionLocal = None
+    engine = create_engine(settings.database_url, **_engine_kwargs(settings.database_url))
+    read_engine = create_engine(replica_url, **_engine_kwargs(replica_url)) if replica_url else engine
+
+has_replica = read_engine is not engine
+
+# ожидание соединения из пула: ORM-сессия берёт соединение сразу после начала своей транзакции,
+# так что интервал от after_transaction_create до события checkout пула - это checkout
+# (ожидание свободного слота, новое соединение, pre-ping)
+_checkout_started: ContextVar[float | None] = ContextVar("checkout_started", default=None)
+
+def _on_transaction_create(session: Session, transaction):
+    if transaction.parent is None:
+        _checkout_started.set(time.perf_counter())
+
+def _checkout_timer(name: str):
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        started = _checkout_started.get()
+        if started is None:
+            return  # checkout не из ORM-сессии (engine.connect() в schema и т.п.)
+        _checkout_started.set(None)
+        db_pool_checkout_wait.observe(time.perf_counter() - started, name)
+    return on_checkout
+
+event.listen(Session, "after_transaction_create", _on_transaction_create)
+event.listen(engine.pool, "checkout", _checkout_timer("primary"))
+if has_replica:
+    event.listen(read_engine.pool, "checkout", _checkout_timer("replica"))
+
+# учёт SQL по запросу (Server-Timing) и лог медленных запросов
+if settings.server_timing or settings.slow_query_ms:
+    instrument_engine(engine)
+    if has_replica:
+        instrument_engine(read_engine)
+
+# в async-режиме SessionLocal привязан к sync_engine и работает только внутри AsyncSession.run_sync.
+# expire_on_commit=False в обоих режимах: ORM-объекты после commit читаются уже в async-роутах,
+# и ленивый refresh там либо блокировал бы loop, либо падал бы вне greenlet
+SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False, expire_on_commit=False)
+
+# read-your-writes: после записи клиент (пользователь запроса, его ставит AuthMiddleware)
+# какое-то время читает с primary, чтобы не увидеть на реплике состояние до собственного commit.
+# Остальные клиенты продолжают читать с реплики. Учёт - в памяти процесса: следующий запрос
+# того же клиента в другом воркере может попасть на реплику
+current_client: ContextVar[int | None] = ContextVar("current_client", default=None)
+_primary_until: dict[int, float] = {}
+# при таком числе ключей выбрасываем истёкшие
+_STICKY_PRUNE_AT = 10_000
+
+def note_write():
+    client = current_client.get()
+    if client is None:
+        return
+    now = time.monotonic()
+    if len(_primary_until) >= _STICKY_PRUNE_AT:
+        for key, until in list(_primary_until.items()):
+            if until <= now:
+                _primary_until.pop(key, None)
+    _primary_until[client] = now + settings.db_replica_stick_seconds
+
+def use_replica() -> bool:
+    if not has_replica:
+        return False
+    client = current_client.get()
+    return client is None or time.monotonic() >= _primary_until.get(client, 0.0)
+
+def _after_commit(session: Session):
+    # AsyncSession коммитит через свой sync Session, bind у него тот же engine
+    if session.bind is engine:
+        note_write()
+
+if has_replica:
+    event.listen(Session, "after_commit", _after_commit)
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+# то, что отдаёт get_db: Session в обычном режиме, AsyncSession в async-режиме
+AnySession = Session | AsyncSession
 
 class Base(DeclarativeBase):
     pass
 
-def get_db():
+class UtcDateTime(TypeDecorator):
+    """DateTime(timezone=True), который всегда возвращает aware-время (SQLite хранит naive)."""
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_result_value(self, value: datetime | None, dialect):
+        if value is not None and value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
+
+def _get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def _get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+get_db = _get_async_db if is_async else _get_sync_db
+
+def _get_sync_read_db():
+    db = ReadSessionLocal() if use_replica() else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def _get_async_read_db():
+    async with (AsyncReadSessionLocal() if use_replica() else AsyncSessionLocal()) as db:
+        yield db
+
+# для обработчиков, которые только читают (списки, GET по id): реплика, если настроена
+get_read_db = _get_async_read_db if is_async else _get_sync_read_db
+
+def pool_stats() -> dict:
+    engines = {"primary": engine, "replica": read_engine} if has_replica else {"primary": engine}
+    stats = {}
+    for name, eng in engines.items():
+        pool = eng.pool
+        if isinstance(pool, QueuePool):
+            stats[name] = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                # пока пул не заполнен до pool_size, QueuePool.overflow() отрицателен
+                "overflow": max(0, pool.overflow()),
+            }
+        else:
+            stats[name] = {"status": pool.status()}
+    return stats
+
+def _pool_gauge(field: str):
+    def collect():
+        return {(name,): s[field] for name, s in pool_stats().items() if field in s}
+    return collect
+
+registry.gauge("db_pool_checked_out", "Соединения, выданные из пула", ("engine",), _pool_gauge("checked_out"))
+registry.gauge("db_pool_size", "Размер пула (без overflow)", ("engine",), _pool_gauge("size"))
+registry.gauge("db_pool_overflow", "Соединения сверх pool_size", ("engine",), _pool_gauge("overflow"))
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Выполнить синхронную функцию fn(session, *args, **kwargs), не блокируя event loop:
+      - AsyncSession: через run_sync (greenlet + async-драйвер, без потоков)
+      - Session: в пуле потоков Starlette
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
@@ -0,0 +1,57 @@
+"""
+ETag / If-None-Match для редко меняющихся GET.
+
+Версия таблицы - счётчик в data_versions, который пишущие эндпоинты увеличивают в той же
+транзакции, что и данные. Поэтому версия общая для всех воркеров, а 304 стоит один
+PK-запрос без чтения самих данных и без сериализации.
+"""
+import zlib
+
+from fastapi import Request, Response
+from sqlalchemy import BigInteger, String, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Mapped, Session, mapped_column
+
+from .database import Base
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0)
+
+def bump_version(db: Session, key: str):
+    """Вызывать до commit пишущей транзакции."""
+    bumped = db.execute(
+        update(DataVersion).where(DataVersion.key == key).values(version=DataVersion.version + 1),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    if bumped:
+        return
+    # первая запись по ключу; при гонке с другим воркером строка уже есть - повторяем UPDATE
+    try:
+        with db.begin_nested():
+            db.add(DataVersion(key=key, version=1))
+    except IntegrityError:
+        db.execute(
+            update(DataVersion).where(DataVersion.key == key).values(version=DataVersion.version + 1),
+            execution_options={"synchronize_session": False},
+        )
+
+def get_version(db: Session, key: str) -> int:
+    return db.execute(select(DataVersion.version).where(DataVersion.key == key)).scalar_one_or_none() or 0
+
+def make_etag(key: str, version, request: Request) -> str:
+    # разные query-параметры (страница, фильтры) - разные представления
+    variant = zlib.crc32(request.url.query.encode())
+    return f'"{key}.{version}.{variant:x}"'
+
+def matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
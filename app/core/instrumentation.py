@@ -0,0 +1,129 @@
+"""
+Учёт SQL по запросу: число инструкций и время в БД по фазам auth / authz / handler.
+
+Хуки курсора вешаются на engine в app/core/database.py, статистика запроса лежит
+в ContextVar: anyio.to_thread и AsyncSession.run_sync выполняют код в копии контекста,
+поэтому запросы из пула потоков и из AuthMiddleware попадают в тот же объект.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+
+slow_query_logger = logging.getLogger("app.sql.slow")
+
+PHASES = ("auth", "authz", "handler")
+
+class PhaseStats:
+    __slots__ = ("queries", "db_time", "wall")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.wall = 0.0
+
+class RequestTiming:
+    __slots__ = ("phase", "phases", "started")
+
+    def __init__(self):
+        self.phase = "handler"
+        self.phases = {name: PhaseStats() for name in PHASES}
+        self.started = time.perf_counter()
+
+    @property
+    def queries(self) -> int:
+        return sum(p.queries for p in self.phases.values())
+
+    @property
+    def db_time(self) -> float:
+        return sum(p.db_time for p in self.phases.values())
+
+    def server_timing(self) -> str:
+        total = time.perf_counter() - self.started
+        handler = self.phases["handler"]
+        # handler - всё, что не auth и не authz
+        handler.wall = max(0.0, total - self.phases["auth"].wall - self.phases["authz"].wall)
+        parts = [
+            f'{name};dur={p.wall * 1000:.2f};desc="q={p.queries} db={p.db_time * 1000:.2f}ms"'
+            for name, p in self.phases.items()
+        ]
+        parts.append(f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries"')
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+_current: ContextVar[RequestTiming | None] = ContextVar("request_timing", default=None)
+
+def current_timing() -> RequestTiming | None:
+    return _current.get()
+
+@contextmanager
+def phase(name: str):
+    """Отнести SQL и время внутри блока к фазе name. Вне запроса и при вложенности - no-op."""
+    timing = _current.get()
+    if timing is None or timing.phase == name:
+        yield
+        return
+    prev = timing.phase
+    timing.phase = name
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.phases[name].wall += time.perf_counter() - started
+        timing.phase = prev
+
+# ---- хуки SQLAlchemy ----
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._timing_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._timing_started
+    timing = _current.get()
+    if timing is not None:
+        stats = timing.phases[timing.phase]
+        stats.queries += 1
+        stats.db_time += elapsed
+    if settings.slow_query_ms and elapsed * 1000 >= settings.slow_query_ms:
+        slow_query_logger.warning(
+            "slow query %.1fms phase=%s: %s",
+            elapsed * 1000, timing.phase if timing is not None else "-", statement,
+        )
+
+def instrument_engine(engine):
+    from sqlalchemy import event
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+class ServerTimingMiddleware:
+    """
+    Самый внешний middleware: заводит RequestTiming на запрос и дописывает
+    Server-Timing и X-DB-Queries в ответ.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timing.server_timing())
+                headers.append("X-DB-Queries", str(timing.queries))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
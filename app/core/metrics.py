@@ -0,0 +1,259 @@
+"""
+Минимальный реестр метрик в формате Prometheus (text exposition 0.0.4), без внешних зависимостей.
+
+Счётчики шардированы по потокам: каждый поток пишет в свой dict без блокировок,
+lock берётся один раз на поток при создании шарда. /metrics суммирует шарды.
+Шарды завершившихся потоков сливаются в общий base - потоки пула AnyIO/Starlette
+умирают после простоя и создаются заново, и без этого шардов становилось бы всё больше.
+"""
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> list[str]:
+        ...
+
+class _ShardedMetric(_Metric):
+    """Значения пишутся в шард своего потока; _merge складывает шард в накопитель."""
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._local = threading.local()
+        self._shards: list[tuple[threading.Thread, dict]] = []
+        self._base: dict = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = {}
+            with self._lock:
+                self._fold_dead()
+                self._shards.append((threading.current_thread(), values))
+            self._local.values = values
+            return values
+
+    def _fold_dead(self):
+        # под self._lock; в шард мёртвого потока больше никто не пишет
+        live = []
+        for thread, values in self._shards:
+            if thread.is_alive():
+                live.append((thread, values))
+            else:
+                self._merge(self._base, values)
+        self._shards = live
+
+    @abstractmethod
+    def _merge(self, into: dict, values: dict):
+        ...
+
+    def _snapshots(self) -> list[dict]:
+        with self._lock:
+            self._fold_dead()
+            shards = [self._base] + [values for _, values in self._shards]
+            # dict.copy атомарен под GIL - шард можно читать, пока его поток пишет
+            return [s.copy() for s in shards]
+
+class Counter(_ShardedMetric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        values = self._shard()
+        values[labels] = values.get(labels, 0) + amount
+
+    def _merge(self, into: dict, values: dict):
+        for labels, v in values.items():
+            into[labels] = into.get(labels, 0) + v
+
+    def collect(self) -> dict[tuple, float]:
+        total: dict[tuple, float] = {}
+        for shard in self._snapshots():
+            for labels, v in shard.items():
+                total[labels] = total.get(labels, 0) + v
+        return total
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        for labels, v in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {v}")
+        return lines
+
+class Histogram(_ShardedMetric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        values = self._shard()
+        # [счётчики по корзинам (+Inf последняя), sum, count]
+        cell = values.get(labels)
+        if cell is None:
+            cell = values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def _merge(self, into: dict, values: dict):
+        for labels, cell in values.items():
+            acc = into.get(labels)
+            if acc is None:
+                into[labels] = list(cell)
+            else:
+                for i, v in enumerate(cell):
+                    acc[i] += v
+
+    def collect(self) -> dict[tuple, list]:
+        total: dict[tuple, list] = {}
+        for shard in self._snapshots():
+            for labels, cell in shard.items():
+                acc = total.get(labels)
+                if acc is None:
+                    total[labels] = list(cell)
+                else:
+                    for i, v in enumerate(cell):
+                        acc[i] += v
+        return total
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        for labels, cell in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), cell):
+                cumulative += n
+                le = _labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {cell[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cell[-1]}")
+        return lines
+
+class Gauge(_Metric):
+    """Значение снимается в момент /metrics: collect() -> {labels: value}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...], collect):
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        for labels, v in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {v}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...], collect) -> Gauge:
+        metric = Gauge(name, help, labelnames, collect)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# ---- метрики приложения ----
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Длительность HTTP-запроса", ("method", "route", "status"),
+)
+auth_outcomes = registry.counter(
+    "auth_outcomes_total", "Результат аутентификации запроса в AuthMiddleware", ("outcome",),
+)
+logins = registry.counter("auth_logins_total", "Попытки входа", ("outcome",))
+registrations = registry.counter("auth_registrations_total", "Попытки регистрации", ("outcome",))
+rate_limited = registry.counter(
+    "auth_rate_limited_total", "Попытки логина/регистрации, отклонённые лимитером", ("endpoint", "key"),
+)
+bcrypt_seconds = registry.histogram(
+    "auth_bcrypt_seconds", "Время bcrypt-операции в пуле хэширования, включая ожидание в очереди", ("op",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0),
+)
+authz_denials = registry.counter(
+    "authz_denials_total", "Отказы в доступе по ресурсу и действию", ("resource", "action"),
+)
+db_pool_checkout_wait = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Ожидание свободного соединения в пуле", ("engine",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+
+# ---- HTTP ----
+
+class MetricsMiddleware:
+    """Гистограмма длительности по шаблону маршрута (не по сырому пути - иначе взрыв кардинальности)."""
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                scope["method"], getattr(route, "path", "unmatched"), status,
+            )
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,18 @@
+from fastapi import Response
+
+# keyset-пагинация: ?after_id=<последний id>&limit=N, следующий курсор - в заголовке X-Next-Cursor
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def keyset_page(q, model, after_id: int | None, limit: int) -> tuple[list, int | None]:
+    if after_id is not None:
+        q = q.filter(model.id > after_id)
+    # берём на одну строку больше - так без COUNT узнаём, есть ли следующая страница
+    rows = q.order_by(model.id).limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
+def set_cursor(response: Response, next_cursor: int | None):
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
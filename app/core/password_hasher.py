@@ -0,0 +1,96 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from .config import settings
+from .metrics import bcrypt_seconds
+from .security import hash_password, verify_password
+
+class PasswordHasherBusy(Exception):
+    """Очередь bcrypt заполнена — запрос надо отклонить сразу, а не ставить в хвост."""
+
+class PasswordHasher:
+    """
+    Выделенный пул для bcrypt с ограниченной очередью.
+    bcrypt отпускает GIL, поэтому по умолчанию хватает отдельного пула потоков;
+    executor="process" — пул процессов. Пул не пересекается с пулом потоков Starlette,
+    так что всплеск логинов не отнимает потоки у остальных endpoints.
+    """
+    def __init__(self, executor: str, workers: int, max_pending: int):
+        self.executor_kind = executor
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def is_full(self) -> bool:
+        return self._pending >= self.max_pending
+
+    async def hash(self, raw: str) -> str:
+        return await self._submit("hash", hash_password, raw)
+
+    async def verify(self, raw: str, hashed: str) -> bool:
+        return await self._submit("verify", verify_password, raw, hashed)
+
+    def stats(self) -> dict:
+        completed = self.completed
+        return {
+            "executor": self.executor_kind,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "completed": completed,
+            "rejected": self.rejected,
+            "latency_avg_ms": round(self._latency_total / completed * 1000, 2) if completed else 0.0,
+            "latency_max_ms": round(self._latency_max * 1000, 2),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _submit(self, op: str, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self._pending += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.wrap_future(self._get_executor().submit(fn, *args))
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+                self._latency_total += elapsed
+                self._latency_max = max(self._latency_max, elapsed)
+            bcrypt_seconds.observe(elapsed, op)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.executor_kind == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+password_hasher = PasswordHasher(
+    executor=settings.bcrypt_executor,
+    workers=settings.bcrypt_workers,
+    max_pending=settings.bcrypt_max_pending,
+)
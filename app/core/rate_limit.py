@@ -0,0 +1,103 @@
+"""
+Ограничение частоты логина и регистрации: token bucket по IP и по email.
+
+Проверка идёт первой строкой эндпоинта - до запроса в БД и до bcrypt, так что поток
+мусорных попыток стоит единицы микросекунд на запрос, а не CPU пула хэширования.
+
+Хранилище подключаемое (RateLimitStore). По умолчанию MemoryStore - в памяти процесса,
+с шардированными блокировками; при нескольких воркерах лимит действует на каждый воркер
+отдельно. Общее хранилище (Redis и т.п.) реализует тот же hit() атомарно на своей стороне.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from .config import settings
+from .metrics import rate_limited
+
+class RateLimitStore(ABC):
+    """Интерфейс хранилища. hit() списывает токен; 0 - разрешено, иначе через сколько секунд повторить."""
+    @abstractmethod
+    def hit(self, key: str, capacity: int, period: float) -> float:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+class _Shard:
+    __slots__ = ("lock", "buckets", "next_sweep")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> [токены, время обновления, когда ведро снова полное]
+        self.buckets: dict[str, list[float]] = {}
+        self.next_sweep = 0.0
+
+class MemoryStore(RateLimitStore):
+    """
+    Ведра в словарях по шардам (шард - по hash(key)), у каждого свой lock: проверка O(1),
+    конкурирующие потоки почти не встречаются на одной блокировке.
+    Раз в sweep_interval шард выбрасывает полные ведра - они ничем не отличаются от отсутствующих,
+    так что память растёт только с числом ключей, активных за последний период.
+    """
+    def __init__(self, shards: int = 64, sweep_interval: float = 60):
+        # число шардов - степень двойки, чтобы выбирать шард маской
+        size = 1 << max(shards - 1, 0).bit_length()
+        self._shards = [_Shard() for _ in range(size)]
+        self._mask = size - 1
+        self.sweep_interval = sweep_interval
+
+    def hit(self, key: str, capacity: int, period: float) -> float:
+        rate = capacity / period
+        now = time.monotonic()
+        shard = self._shards[hash(key) & self._mask]
+        with shard.lock:
+            if now >= shard.next_sweep:
+                self._sweep(shard, now)
+            bucket = shard.buckets.get(key)
+            tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            shard.buckets[key] = [tokens, now, now + (capacity - tokens) / rate]
+        return 0.0 if allowed else (1 - tokens) / rate
+
+    def _sweep(self, shard: _Shard, now: float):
+        shard.buckets = {k: b for k, b in shard.buckets.items() if b[2] > now}
+        shard.next_sweep = now + self.sweep_interval
+
+    def stats(self) -> dict:
+        return {"keys": sum(len(s.buckets) for s in self._shards), "shards": len(self._shards)}
+
+class RateLimiter:
+    """Лимиты одного эндпоинта: per_ip и per_email попыток за period секунд (0 - без лимита)."""
+    def __init__(self, name: str, store: RateLimitStore, per_ip: int, per_email: int, period: float):
+        self.name = name
+        self.store = store
+        self.per_ip = per_ip
+        self.per_email = per_email
+        self.period = period
+
+    def check(self, ip: str | None, email: str | None) -> float:
+        """0 - попытка разрешена; иначе Retry-After в секундах."""
+        if self.per_ip and ip:
+            wait = self.store.hit(f"{self.name}:ip:{ip}", self.per_ip, self.period)
+            if wait:
+                rate_limited.inc(self.name, "ip")
+                return wait
+        if self.per_email and email:
+            wait = self.store.hit(f"{self.name}:email:{email.strip().lower()}", self.per_email, self.period)
+            if wait:
+                rate_limited.inc(self.name, "email")
+                return wait
+        return 0.0
+
+store: RateLimitStore = MemoryStore()
+
+login_limiter = RateLimiter(
+    "login", store, settings.login_rate_per_ip, settings.login_rate_per_email, settings.auth_rate_period_seconds,
+)
+register_limiter = RateLimiter(
+    "register", store, settings.register_rate_per_ip, settings.register_rate_per_email,
+    settings.auth_rate_period_seconds,
+)
@@ -0,0 +1,189 @@
+"""
+Схема БД и начальные данные: create_all + seed только когда модели действительно изменились.
+
+Отпечаток схемы - sha256 от DDL всех таблиц и индексов под текущий диалект. Он хранится
+в таблице schema_meta; при совпадении старт воркера - один-два лёгких запроса
+без рефлексии таблиц. При расхождении DDL, seed и запись отпечатка идут одной транзакцией,
+на Postgres - под pg_advisory_xact_lock, так что параллельные воркеры не гоняются друг с другом.
+
+create_all не меняет существующие таблицы. Недостающие индексы создаются отдельно, а если
+в существующей таблице не хватает колонок (нужна миграция руками), отпечаток не записывается:
+старт пишет ошибку в лог, status показывает расхождение.
+
+    python -m app.core.schema status
+    python -m app.core.schema migrate
+    python -m app.core.schema seed
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import time
+
+from sqlalchemy import Connection, String, inspect, select
+from sqlalchemy.orm import Mapped, Session, mapped_column
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from .database import Base, async_engine, engine, is_async
+
+logger = logging.getLogger(__name__)
+
+# произвольная константа - ключ advisory lock на Postgres
+_LOCK_KEY = 0x5EED_5C4E
+
+class SchemaMeta(Base):
+    __tablename__ = "schema_meta"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[str] = mapped_column(String(128))
+
+def _metadata():
+    # все модели из реестра - иначе отпечаток зависел бы от того, что успел импортировать вызывающий
+    import app.models  # noqa: F401
+    return Base.metadata
+
+def schema_fingerprint(dialect) -> str:
+    h = hashlib.sha256()
+    for table in sorted(_metadata().tables.values(), key=lambda t: t.name):
+        h.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            h.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    return h.hexdigest()
+
+def stored_fingerprint(conn: Connection) -> str | None:
+    if not conn.dialect.has_table(conn, SchemaMeta.__tablename__):
+        return None
+    return conn.execute(select(SchemaMeta.value).where(SchemaMeta.key == "schema")).scalar_one_or_none()
+
+def _lock(conn: Connection):
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({_LOCK_KEY})")
+    # SQLite: писатель и так один - вторая транзакция дождётся первой (busy timeout)
+
+def _seed(conn: Connection, seed):
+    # Session поверх соединения: её commit() не завершает внешнюю транзакцию
+    db = Session(bind=conn, expire_on_commit=False)
+    try:
+        seed(db)
+        db.commit()
+    finally:
+        db.close()
+
+def _seeded():
+    # только после commit внешней транзакции: иначе другой воркер мог бы собрать снимок политики
+    # по данным до seed и держать его
+    from app.access.service import invalidate_policy
+    invalidate_policy()
+
+def schema_drift(conn: Connection, fix: bool = False) -> list[str]:
+    """
+    Расхождения существующих таблиц с моделями. fix=True - недостающие индексы создаются
+    (и в списке не остаются); колонки так не добавить, они всегда попадают в список.
+    """
+    inspector = inspect(conn)
+    problems = []
+    for table in _metadata().sorted_tables:
+        if not inspector.has_table(table.name):
+            problems.append(f"{table.name}: нет таблицы")
+            continue
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        missing = [c.name for c in table.columns if c.name not in columns]
+        if missing:
+            problems.append(f"{table.name}: нет колонок {', '.join(missing)}")
+        indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in indexes:
+                continue
+            if fix and all(c.name in columns for c in index.columns):
+                index.create(conn)
+                logger.warning("schema: создан недостающий индекс %s", index.name)
+            else:
+                problems.append(f"{table.name}: нет индекса {index.name}")
+    return problems
+
+def bootstrap(conn: Connection, seed=None, force: bool = False) -> str:
+    """
+    Вызывать внутри engine.begin(). Возвращает "up-to-date", "migrated" или "drift"
+    (схема БД не совпадает с моделями и create_all это не исправит - отпечаток не записан).
+    force=True - выполнить create_all и seed независимо от отпечатка.
+    """
+    fingerprint = schema_fingerprint(conn.dialect)
+    if not force and stored_fingerprint(conn) == fingerprint:
+        return "up-to-date"
+
+    _lock(conn)
+    # пока ждали lock, другой воркер мог всё сделать
+    if not force and stored_fingerprint(conn) == fingerprint:
+        return "up-to-date"
+
+    _metadata().create_all(conn)
+    problems = schema_drift(conn, fix=True)
+    if problems:
+        for problem in problems:
+            logger.error("schema drift: %s", problem)
+        return "drift"
+    if seed is not None:
+        _seed(conn, seed)
+
+    meta = conn.execute(select(SchemaMeta).where(SchemaMeta.key == "schema")).first()
+    if meta is None:
+        conn.execute(SchemaMeta.__table__.insert().values(key="schema", value=fingerprint))
+    else:
+        conn.execute(SchemaMeta.__table__.update().where(SchemaMeta.key == "schema").values(value=fingerprint))
+    return "migrated"
+
+async def run_bootstrap(seed=None, force: bool = False) -> str:
+    started = time.perf_counter()
+    if is_async:
+        async with async_engine.begin() as conn:
+            result = await conn.run_sync(bootstrap, seed, force)
+    else:
+        with engine.begin() as conn:
+            result = bootstrap(conn, seed, force)
+    if result == "migrated" and seed is not None:
+        _seeded()
+    logger.info("schema bootstrap: %s in %.1fms", result, (time.perf_counter() - started) * 1000)
+    return result
+
+def _status_sync(conn: Connection) -> tuple[str | None, str, list[str]]:
+    return stored_fingerprint(conn), schema_fingerprint(conn.dialect), schema_drift(conn)
+
+async def _status() -> tuple[str | None, str, list[str]]:
+    if is_async:
+        async with async_engine.connect() as conn:
+            return await conn.run_sync(_status_sync)
+    with engine.connect() as conn:
+        return _status_sync(conn)
+
+async def _seed_only(seed):
+    if is_async:
+        async with async_engine.begin() as conn:
+            await conn.run_sync(_seed, seed)
+    else:
+        with engine.begin() as conn:
+            _seed(conn, seed)
+    _seeded()
+
+def main():
+    parser = argparse.ArgumentParser(description="Схема БД и начальные данные")
+    parser.add_argument("command", choices=["status", "migrate", "seed"])
+    args = parser.parse_args()
+
+    from app.access.seed import seed_if_empty
+
+    if args.command == "status":
+        stored, current, problems = asyncio.run(_status())
+        print(f"stored:  {stored or '-'}\ncurrent: {current}")
+        for problem in problems:
+            print(f"drift:   {problem}")
+        print("up-to-date" if stored == current and not problems else "migration needed")
+    elif args.command == "migrate":
+        result = asyncio.run(run_bootstrap(seed_if_empty, force=True))
+        print(result)
+        if result == "drift":
+            raise SystemExit(1)
+    else:
+        asyncio.run(_seed_only(seed_if_empty))
+        print("seeded")
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,21 @@ import jwt
 from datetime import datetime, timedelta, timezone
 from .config import settings
 
-def hash_password(raw: str) -> str:
-    salt = bcrypt.gensalt()
+def hash_password(raw: str, rounds: int | None = None) -> str:
+    salt = bcrypt.gensalt(rounds=rounds or settings.bcrypt_rounds)
     hashed = bcrypt.hashpw(raw.encode("utf-8"), salt)
     return hashed.decode("utf-8")
 
+def hash_rounds(hashed: str) -> int | None:
+    # формат: $2b$<cost>$<salt+hash>
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+def needs_rehash(hashed: str) -> bool:
+    return hash_rounds(hashed) != settings.bcrypt_rounds
+
 def verify_password(raw: str, hashed: str) -> bool:
     try:
         return bcrypt.checkpw(raw.encode("utf-8"), hashed.encode("utf-8"))
@@ -0,0 +1,54 @@
+"""
+Быстрая отдача JSON для списков.
+
+FastAPI с response_model валидирует результат ещё раз (плюс ручной model_validate в роуте - дважды).
+Здесь роут сам собирает Response, и FastAPI его уже не трогает:
+  - rows_response: строки из БД (доверенные) -> dict по полям схемы -> orjson, без pydantic;
+    без orjson - одна валидация всего списка закэшированным TypeAdapter + dump_json.
+  - FastJSONResponse: orjson для произвольных dict/list, если он установлен.
+"""
+import json
+from functools import lru_cache
+from operator import attrgetter
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # необязательная зависимость
+    orjson = None
+
+@lru_cache(maxsize=None)
+def type_adapter(tp) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+@lru_cache(maxsize=None)
+def _getter(schema: type[BaseModel]) -> tuple[tuple[str, ...], attrgetter]:
+    names = tuple(schema.model_fields)
+    return names, attrgetter(*names)
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def rows_response(schema: type[BaseModel], rows: list, status_code: int = 200, headers: dict | None = None) -> Response:
+    """
+    rows - ORM-объекты, уже соответствующие схеме (из своей же БД), поэтому не валидируются.
+    Поля схемы читаются атрибутами с тем же именем, как при from_attributes.
+    """
+    if orjson is not None:
+        names, get = _getter(schema)
+        if len(names) == 1:
+            body = orjson.dumps([{names[0]: get(r)} for r in rows])
+        else:
+            body = orjson.dumps([dict(zip(names, get(r))) for r in rows])
+    else:
+        adapter = type_adapter(list[schema])
+        body = adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
@@ -0,0 +1,173 @@
+"""
+Состояние, общее для всех воркеров на хосте: mmap-файлы каталога SHARED_STATE_DIR.
+
+  SharedCounter - 8 байт. Чтение - обращение к отображённой памяти (доли микросекунды),
+                  поэтому кэши процесса сверяются со счётчиком на каждой проверке. Увеличение -
+                  под flock: bump сразу делает устаревшим всё, что построено для старого значения.
+  SharedLog     - кольцо последних коротких ключей с номерами (например, отозванные сессии):
+                  читатель забирает только записи после своего номера и сбрасывает только их.
+
+SHARED_STATE_DIR=auto - каталог в /dev/shm (или во временном каталоге ОС), свой для каждой
+DATABASE_URL; пусто - общих счётчиков нет, кэши живут только внутри процесса (годится
+для одного воркера). Воркеры на разных хостах этим не синхронизируются.
+
+Каталог лежит в общем для всех пользователей месте, поэтому принимается, только если он наш
+и закрыт для записи остальным (создаётся 0o700); файлы - 0o600, без перехода по symlink.
+Чужой или открытый каталог - ошибка при старте, а не молчаливое чтение подложенных данных.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import stat
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # не POSIX: общих счётчиков нет
+    fcntl = None
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_VALUE = struct.Struct("=Q")
+# номер записи, ключ (дополняется нулями)
+_LOG_SLOT = struct.Struct("=Q40s")
+
+class _SharedFile:
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self._fd = open_private(path, os.O_RDWR, create=True)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._mm = mmap.mmap(self._fd, size)
+        # flock держится открытым файлом, а не потоком - потоки одного процесса сериализуем сами
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def locked(self):
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+class SharedCounter(_SharedFile):
+    def __init__(self, path: str):
+        super().__init__(path, _VALUE.size)
+
+    def value(self) -> int:
+        return _VALUE.unpack_from(self._mm, 0)[0]
+
+    def bump(self) -> int:
+        with self.locked():
+            value = self.value() + 1
+            _VALUE.pack_into(self._mm, 0, value)
+        return value
+
+class SharedLog(_SharedFile):
+    """
+    Последние slots ключей (до 40 байт) с порядковыми номерами. append() - под flock;
+    since() читает без блокировки и сверяет номер каждого слота: если нужные записи уже
+    перезаписаны (читатель отстал больше чем на slots), вместо ключей возвращается None.
+    """
+    KEY_SIZE = 40
+
+    def __init__(self, path: str, slots: int = 4096):
+        self.slots = slots
+        super().__init__(path, _VALUE.size + slots * _LOG_SLOT.size)
+
+    def seq(self) -> int:
+        return _VALUE.unpack_from(self._mm, 0)[0]
+
+    def append(self, key: bytes) -> int:
+        if len(key) > self.KEY_SIZE:
+            raise ValueError("SharedLog key too long")
+        with self.locked():
+            seq = self.seq() + 1
+            # сначала слот, потом номер: читатель не увидит номер раньше данных
+            _LOG_SLOT.pack_into(self._mm, self._offset(seq), seq, key)
+            _VALUE.pack_into(self._mm, 0, seq)
+        return seq
+
+    def since(self, seq: int) -> tuple[int, list[bytes] | None]:
+        """Текущий номер и ключи, записанные после seq; None - часть из них уже потеряна."""
+        current = self.seq()
+        if current == seq:
+            return current, []
+        if current < seq or current - seq > self.slots:
+            return current, None
+        keys = []
+        for n in range(seq + 1, current + 1):
+            stored, key = _LOG_SLOT.unpack_from(self._mm, self._offset(n))
+            if stored != n:
+                return current, None
+            keys.append(key.rstrip(b"\0"))
+        return current, keys
+
+    def _offset(self, seq: int) -> int:
+        return _VALUE.size + (seq % self.slots) * _LOG_SLOT.size
+
+def open_private(path: str, flags: int, create: bool = False) -> int:
+    """
+    fd файла только для текущего пользователя. create=True - создать 0o600 (O_EXCL), если его нет.
+    Symlink, чужой файл или файл с правами для других - PermissionError.
+    """
+    flags |= os.O_NOFOLLOW
+    if create:
+        try:
+            return os.open(path, flags | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+    fd = os.open(path, flags)
+    st = os.fstat(fd)
+    if st.st_uid != os.getuid() or st.st_mode & 0o022:
+        os.close(fd)
+        raise PermissionError(f"{path}: файл общего состояния должен принадлежать нам и иметь права 0600")
+    if st.st_mode & 0o077:
+        # файл прежних версий (0644): наш, чужие писать в него не могли - просто закрываем
+        os.fchmod(fd, 0o600)
+    return fd
+
+def _private_dir(path: str):
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o022:
+        raise PermissionError(
+            f"SHARED_STATE_DIR {path}: каталог должен принадлежать текущему пользователю "
+            "и не быть доступным на запись другим (chmod 700)"
+        )
+
+def _state_dir() -> str | None:
+    configured = settings.shared_state_dir
+    if not configured:
+        return None
+    if fcntl is None:
+        logger.warning("SHARED_STATE_DIR задан, но flock недоступен - кэши только в пределах процесса")
+        return None
+    if configured != "auto":
+        return configured
+    base = "/dev/shm" if os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+    digest = hashlib.sha1(settings.database_url.encode()).hexdigest()[:12]
+    return os.path.join(base, f"fastapi-auth-{digest}")
+
+def shared_path(name: str) -> str | None:
+    """Путь файла общего состояния name либо None, если общее состояние выключено."""
+    directory = _state_dir()
+    if directory is None:
+        return None
+    _private_dir(directory)
+    return os.path.join(directory, name)
+
+def shared_counter(name: str) -> SharedCounter | None:
+    path = shared_path(name)
+    return SharedCounter(path) if path is not None else None
+
+def shared_log(name: str) -> SharedLog | None:
+    path = shared_path(name)
+    return SharedLog(path) if path is not None else None
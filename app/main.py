@@ -1,30 +1,58 @@
+import asyncio
+
 from fastapi import FastAPI
-from app.core.database import engine, Base, SessionLocal
+from app.core.database import is_async, SessionLocal, AsyncSessionLocal
 from app.core.auth_middleware import AuthMiddleware
+from app.core.config import settings
+from app.core.instrumentation import ServerTimingMiddleware
+from app.core.metrics import MetricsMiddleware, router as metrics_router
+from app.core.password_hasher import password_hasher
+from app.core.schema import run_bootstrap
+from app import models as _models  # noqa: F401 - все таблицы в Base.metadata
 
 from app.accounts.router import router as auth_router
 from app.access.router import router as admin_router
 from app.business.router import router as business_router
 
 from app.access.seed import seed_if_empty
+from app.access.service import invalidate_policy
+from app.accounts.sweeper import run_periodically as run_session_sweeper
 
 app = FastAPI(title="Custom Auth/AuthZ (FastAPI)")
 
 # Middleware должен иметь доступ к БД -> передаём фабрику сессий
-app.add_middleware(AuthMiddleware, db_factory=SessionLocal)
+# сессии проверяются на primary даже при DATABASE_REPLICA_URL (см. AuthMiddleware)
+app.add_middleware(
+    AuthMiddleware,
+    db_factory=AsyncSessionLocal if is_async else SessionLocal,
+)
+# добавлены после AuthMiddleware -> внешние: видят и его SQL, и его время
+if settings.server_timing:
+    app.add_middleware(ServerTimingMiddleware)
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
 
 @app.on_event("startup")
-def on_startup():
-    # для демо можно создать таблицы автоматически
-    Base.metadata.create_all(bind=engine)
+async def on_startup():
+    # таблицы и тестовые данные: полноценно - только если изменилась схема
+    if settings.db_bootstrap == "auto":
+        await run_bootstrap(seed_if_empty)
+    # общая версия политики переживает рестарт, а БД могли пересоздать: снимок строим заново
+    invalidate_policy()
+
+    # периодическая чистка истёкших/отозванных сессий
+    if settings.session_sweep_interval_seconds > 0:
+        app.state.session_sweeper = asyncio.create_task(run_session_sweeper(settings.session_sweep_interval_seconds))
 
-    # сидирование тестовых данных
-    db = SessionLocal()
-    try:
-        seed_if_empty(db)
-    finally:
-        db.close()
+@app.on_event("shutdown")
+async def on_shutdown():
+    sweeper = getattr(app.state, "session_sweeper", None)
+    if sweeper is not None:
+        sweeper.cancel()
+    password_hasher.shutdown()
 
 app.include_router(auth_router)
 app.include_router(admin_router)
 app.include_router(business_router)
+if settings.metrics_enabled:
+    app.include_router(metrics_router)
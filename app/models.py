@@ -0,0 +1,12 @@
+"""
+Реестр всех ORM-моделей. Импорт модуля регистрирует их в Base.metadata.
+
+Его импортируют app.main, отпечаток схемы и CLI (app.core.schema, app.access.seed_synthetic):
+create_all и отпечаток везде считаются по одному набору таблиц. Новую модель добавлять сюда.
+SchemaMeta здесь нет: она объявлена в app.core.schema, которая сама импортирует этот модуль
+(и запускается как __main__ - повторный импорт объявил бы таблицу дважды).
+"""
+from app.accounts.models import User, Session  # noqa: F401
+from app.access.models import Role, Resource, UserRole, RoleParent, RoleClosure, AccessRule  # noqa: F401
+from app.business.models import Product, Order  # noqa: F401
+from app.core.etag import DataVersion  # noqa: F401
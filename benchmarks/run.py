@@ -0,0 +1,287 @@
+"""
+Воспроизводимые замеры горячих путей: аутентификация, авторизация, списки.
+
+    python -m benchmarks.run --out before.json
+    python -m benchmarks.run --async --out after.json
+    python -m benchmarks.run --compare before.json after.json
+
+Приложение поднимается in-process (TestClient) на свежей SQLite-базе. Для каждого
+сценария: throughput, p50/p99 и число SQL-инструкций на операцию. Результат - JSON,
+два прогона можно сравнить через --compare. Это не тесты: ничего не проверяется,
+только измеряется.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    idx = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+class SqlCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+class Bench:
+    def __init__(self, client, sql: SqlCounter, iterations: int):
+        self.client = client
+        self.sql = sql
+        self.iterations = iterations
+        self.results: dict[str, dict] = {}
+
+    def _record(self, name: str, timings: list[float], total: float, statements: int):
+        timings.sort()
+        n = len(timings)
+        self.results[name] = {
+            "iterations": n,
+            "throughput_ops": round(n / total, 1),
+            "p50_ms": round(_percentile(timings, 0.50) * 1000, 3),
+            "p99_ms": round(_percentile(timings, 0.99) * 1000, 3),
+            "mean_ms": round(statistics.fmean(timings) * 1000, 3),
+            "sql_per_op": round(statements / n, 2),
+        }
+        r = self.results[name]
+        print(f"{name:<40} {r['throughput_ops']:>10.1f}/s  p50={r['p50_ms']:>8.3f}ms  "
+              f"p99={r['p99_ms']:>8.3f}ms  sql={r['sql_per_op']:.2f}", flush=True)
+
+    def run(self, name: str, fn, iterations: int | None = None, before=None):
+        """fn - синхронная операция (обычно HTTP-запрос); before - подготовка вне замера."""
+        n = iterations or self.iterations
+        fn()  # прогрев
+        timings = []
+        statements = 0
+        for _ in range(n):
+            if before is not None:
+                before()
+            sql_before = self.sql.count
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+            statements += self.sql.count - sql_before
+        self._record(name, timings, sum(timings), statements)
+
+    def run_async(self, name: str, fn, iterations: int | None = None, before=None):
+        """fn - корутина; весь цикл выполняется в event loop приложения, без портала на каждую итерацию."""
+        n = iterations or self.iterations
+
+        async def loop():
+            await fn()
+            timings = []
+            statements = 0
+            for _ in range(n):
+                if before is not None:
+                    before()
+                sql_before = self.sql.count
+                started = time.perf_counter()
+                await fn()
+                timings.append(time.perf_counter() - started)
+                statements += self.sql.count - sql_before
+            return timings, statements
+
+        timings, statements = self.client.portal.call(loop)
+        self._record(name, timings, sum(timings), statements)
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _seed_spec(prefix: str, **overrides) -> argparse.Namespace:
+    spec = dict(
+        prefix=prefix, users=0, roles=0, resources=0, roles_per_user=0, rule_density=1.0, all_ratio=0.2,
+        sessions_per_user=0, dead_session_ratio=0, products_per_user=0, orders_per_user=0,
+        password="synthetic123", batch_size=5000, seed=0,
+    )
+    spec.update(overrides)
+    return argparse.Namespace(**spec)
+
+def run_benchmarks(args) -> dict:
+    db_path = os.path.abspath(args.db)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    driver = "sqlite+aiosqlite" if args.use_async else "sqlite"
+    # настройки читаются при импорте app.*, поэтому окружение - до импорта
+    os.environ["DATABASE_URL"] = f"{driver}:///{db_path}"
+    os.environ.setdefault("SESSION_SWEEP_INTERVAL_SECONDS", "0")
+    # бенчмарк логинится в цикле с одного адреса - лимитер мерил бы 429, а не bcrypt
+    os.environ.setdefault("LOGIN_RATE_PER_IP", "0")
+    os.environ.setdefault("LOGIN_RATE_PER_EMAIL", "0")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import insert, select
+    from app.main import app
+    from app.core.config import settings
+    from app.core.database import AsyncSessionLocal, SessionLocal, async_engine, engine, is_async, run_db
+    from app.accounts.models import User
+    from app.accounts.session_cache import session_cache
+    from app.access.models import Role
+    from app.access.policy import policy_cache
+    from app.access.seed_synthetic import Spec, seed_synthetic
+    from app.access.service import can_async
+    from app.core.rate_limit import MemoryStore, RateLimiter
+    from app.business.models import Product
+
+    sql = SqlCounter(async_engine.sync_engine if is_async else engine)
+
+    async def with_db(fn, *fn_args):
+        if is_async:
+            async with AsyncSessionLocal() as db:
+                return await run_db(db, fn, *fn_args)
+        db = SessionLocal()
+        try:
+            return await run_db(db, fn, *fn_args)
+        finally:
+            db.close()
+
+    with TestClient(app) as client:
+        bench = Bench(client, sql, args.iterations)
+
+        def login(email: str, password: str) -> tuple[str, str | None]:
+            r = client.post("/api/auth/login", json={"email": email, "password": password})
+            r.raise_for_status()
+            client.cookies.clear()
+            return r.json()["token"], r.cookies.get(settings.cookie_name)
+
+        admin_token, _ = login("admin@example.com", "admin123")
+        manager_token, _ = login("manager@example.com", "manager123")
+        user_token, user_cookie = login("user@example.com", "user123")
+        bearer = lambda token: {"Authorization": f"Bearer {token}"}
+
+        # ---- AuthMiddleware: JWT и cookie, с кэшем сессий и без ----
+        me = lambda **kw: client.get("/api/auth/me", **kw)
+        bench.run("auth.jwt.warm", lambda: me(headers=bearer(user_token)))
+        bench.run("auth.jwt.cold", lambda: me(headers=bearer(user_token)), before=session_cache.clear)
+        if user_cookie:
+            cookie_header = {"Cookie": f"{settings.cookie_name}={user_cookie}"}
+            bench.run("auth.cookie.warm", lambda: me(headers=cookie_header))
+            bench.run("auth.cookie.cold", lambda: me(headers=cookie_header), before=session_cache.clear)
+
+        # ---- лимитер логина: проверка IP + email до БД и bcrypt, без HTTP ----
+        # 10k разных клиентов по кругу - ведра в шардах как при реальном трафике
+        clients = itertools.cycle([(f"10.0.{i // 256}.{i % 256}", f"client{i}@example.com") for i in range(10_000)])
+        limiter = RateLimiter("bench", MemoryStore(), per_ip=1_000_000, per_email=1_000_000, period=60)
+        bench.run("rate_limit.check", lambda: limiter.check(*next(clients)), iterations=args.iterations * 20)
+        blocked = RateLimiter("bench-blocked", MemoryStore(), per_ip=1, per_email=1, period=3600)
+        bench.run("rate_limit.check.limited", lambda: blocked.check("10.0.0.1", "client@example.com"),
+                  iterations=args.iterations * 20)
+
+        # ---- login (bcrypt) ----
+        bench.run("login.bcrypt", lambda: login("user@example.com", "user123"), iterations=args.login_iterations)
+
+        # ---- can() при разном числе ролей у пользователя ----
+        for roles_per_user in args.role_counts:
+            prefix = f"bench-can-{roles_per_user}"
+            client.portal.call(with_db, seed_synthetic, Spec(_seed_spec(
+                prefix, users=1, roles=roles_per_user, resources=args.resources, roles_per_user=roles_per_user,
+            )))
+            uid = client.portal.call(with_db, lambda db: db.execute(
+                select(User.id).where(User.email == f"{prefix}-0@synthetic.test")).scalar_one())
+
+            async def check(db_uid=uid, code=f"{prefix}-res-0"):
+                if is_async:
+                    async with AsyncSessionLocal() as db:
+                        await can_async(db, db_uid, code, "read", owner_id=db_uid)
+                else:
+                    db = SessionLocal()
+                    try:
+                        await can_async(db, db_uid, code, "read", owner_id=db_uid)
+                    finally:
+                        db.close()
+
+            bench.run_async(f"can.roles={roles_per_user}.warm", check)
+            bench.run_async(f"can.roles={roles_per_user}.cold", check, before=policy_cache.bump)
+
+        # ---- /api/products: read_all (manager) против только своих (user) ----
+        def add_products(db, owner_id: int, n: int):
+            db.execute(insert(Product.__table__), [{"name": f"P{i}", "owner_id": owner_id} for i in range(n)])
+            db.commit()
+        user_id = client.portal.call(with_db, lambda db: db.execute(
+            select(User.id).where(User.email == "user@example.com")).scalar_one())
+        client.portal.call(with_db, seed_synthetic, Spec(_seed_spec(
+            "bench-products", users=args.product_owners, products_per_user=args.products_per_owner,
+        )))
+        client.portal.call(with_db, add_products, user_id, args.products_per_owner)
+        bench.run("products.list.read_all", lambda: client.get("/api/products", headers=bearer(manager_token)))
+        bench.run("products.list.own", lambda: client.get("/api/products", headers=bearer(user_token)))
+
+        # ---- админские списки при разном размере таблиц ----
+        seeded_roles = client.portal.call(with_db, lambda db: db.query(Role).count())
+        for size in args.table_sizes:
+            if size > seeded_roles:
+                client.portal.call(with_db, seed_synthetic, Spec(_seed_spec(
+                    f"bench-admin-{size}", roles=size - seeded_roles, resources=1,
+                )))
+                seeded_roles = size
+            bench.run(f"admin.roles.list.n={size}", lambda: client.get("/api/admin/roles", headers=bearer(admin_token)))
+            bench.run(f"admin.rules.list.n={size}", lambda: client.get("/api/admin/access-rules", headers=bearer(admin_token)))
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": driver,
+            "iterations": args.iterations,
+        },
+        "scenarios": bench.results,
+    }
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = json.load(f)["scenarios"]
+    with open(after_path) as f:
+        after = json.load(f)["scenarios"]
+    print(f"{'scenario':<40} {'p50 before':>11} {'p50 after':>10} {'change':>8} {'sql before':>11} {'sql after':>10}")
+    for name in sorted(before.keys() | after.keys()):
+        b, a = before.get(name), after.get(name)
+        if b is None or a is None:
+            print(f"{name:<40} {'-' if b is None else b['p50_ms']:>11} {'-' if a is None else a['p50_ms']:>10}")
+            continue
+        change = (a["p50_ms"] - b["p50_ms"]) / b["p50_ms"] * 100 if b["p50_ms"] else 0.0
+        print(f"{name:<40} {b['p50_ms']:>11.3f} {a['p50_ms']:>10.3f} {change:>+7.1f}% "
+              f"{b['sql_per_op']:>11.2f} {a['sql_per_op']:>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры горячих путей auth/authz/admin")
+    parser.add_argument("--out", help="куда сохранить JSON с результатами")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="сравнить два JSON и выйти")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="sqlite+aiosqlite вместо sqlite")
+    parser.add_argument("--db", default="/tmp/fastapi-auth-bench.db", help="файл SQLite (пересоздаётся)")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--login-iterations", type=int, default=20)
+    parser.add_argument("--role-counts", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--resources", type=int, default=50, help="ресурсов в матрице для сценария can()")
+    parser.add_argument("--product-owners", type=int, default=1000)
+    parser.add_argument("--products-per-owner", type=int, default=10)
+    parser.add_argument("--table-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    result = run_benchmarks(args)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nsaved to {args.out}")
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Тесты идут на временной SQLite-базе. Окружение задаётся до первого импорта app.*:
+настройки читаются при импорте, а DATABASE_URL из окружения разработчика тесты бы стёрли.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_db_dir = tempfile.mkdtemp(prefix="fastapi-auth-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+# общие счётчики воркеров тестам не нужны
+os.environ["SHARED_STATE_DIR"] = ""
+
+@pytest.fixture
+def db():
+    from app import models  # noqa: F401
+    from app.core.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
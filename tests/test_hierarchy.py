@@ -0,0 +1,82 @@
+"""role_closure (app/access/hierarchy.py) против пересчёта путей перебором по role_parents."""
+import random
+
+import pytest
+from fastapi import HTTPException
+
+from app.access.hierarchy import add_parent, detach_role, remove_parent
+from app.access.models import Role, RoleClosure, RoleParent
+
+def expected_closure(edges: list[tuple[int, int]]) -> dict[tuple[int, int], int]:
+    """(descendant, ancestor) -> число путей; строка (r, r) - только у ролей с родителями."""
+    children: dict[int, list[int]] = {}
+    for parent_id, role_id in edges:
+        children.setdefault(parent_id, []).append(role_id)
+
+    result = {}
+    for ancestor in children:
+        counts: dict[int, int] = {}
+        stack = [ancestor]
+        # граф ацикличен: каждый проход до узла - отдельный путь
+        while stack:
+            for child in children.get(stack.pop(), []):
+                counts[child] = counts.get(child, 0) + 1
+                stack.append(child)
+        for descendant, paths in counts.items():
+            result[(descendant, ancestor)] = paths
+    for _, role_id in edges:
+        result[(role_id, role_id)] = 1
+    return result
+
+def stored_closure(db) -> dict[tuple[int, int], int]:
+    return {(r.descendant_id, r.ancestor_id): r.paths for r in db.query(RoleClosure)}
+
+def make_roles(db, n: int) -> list[int]:
+    roles = [Role(name=f"role-{i}", description="") for i in range(n)]
+    db.add_all(roles)
+    db.commit()
+    return [r.id for r in roles]
+
+def test_diamond_counts_both_paths(db):
+    top, left, right, bottom = make_roles(db, 4)
+    for role_id, parent_id in ((left, top), (right, top), (bottom, left), (bottom, right)):
+        add_parent(db, role_id, parent_id)
+    db.commit()
+    assert stored_closure(db)[(bottom, top)] == 2
+
+    edge = db.query(RoleParent).filter(RoleParent.role_id == bottom, RoleParent.parent_id == left).one()
+    remove_parent(db, edge)
+    db.commit()
+    assert stored_closure(db)[(bottom, top)] == 1
+
+def test_cycle_is_rejected(db):
+    a, b, c = make_roles(db, 3)
+    add_parent(db, b, a)
+    add_parent(db, c, b)
+    db.commit()
+    with pytest.raises(HTTPException) as exc:
+        add_parent(db, a, c)
+    assert exc.value.status_code == 400
+
+@pytest.mark.parametrize("seed", [1, 7, 42])
+def test_random_changes_keep_closure_consistent(db, seed):
+    rng = random.Random(seed)
+    role_ids = make_roles(db, 12)
+    for step in range(300):
+        edges = db.query(RoleParent).all()
+        roll = rng.random()
+        try:
+            if edges and roll < 0.35:
+                remove_parent(db, rng.choice(edges))
+            elif roll < 0.38:
+                detach_role(db, rng.choice(role_ids))
+            else:
+                add_parent(db, rng.choice(role_ids), rng.choice(role_ids))
+        except HTTPException:
+            # цикл или повторное ребро - иерархия не должна измениться
+            db.rollback()
+        else:
+            db.commit()
+
+        expected = expected_closure([(e.parent_id, e.role_id) for e in db.query(RoleParent)])
+        assert stored_closure(db) == expected, f"step {step}"